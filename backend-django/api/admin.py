@@ -18,6 +18,7 @@ class CattleAdmin(admin.ModelAdmin):
     list_display = ("tag_number", "name", "breed", "age_years", "weight_kg", "last_checkup", "owner")
     search_fields = ("tag_number", "name", "breed")
     list_filter = ("breed",)
+    list_select_related = ("owner",)
 
 @admin.register(Media)
 class MediaAdmin(admin.ModelAdmin):
@@ -30,3 +31,11 @@ class DiagnosisAdmin(admin.ModelAdmin):
     list_filter = ("severity", "status", "created_at")
     search_fields = ("cattle__tag_number", "top_prediction")
     readonly_fields = ("created_at",)
+    list_select_related = ("cattle", "cattle__owner")
+
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request)
+            .select_related("cattle", "cattle__owner", "submitted_by", "reviewed_by")
+            .prefetch_related("images")
+        )
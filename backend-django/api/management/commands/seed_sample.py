@@ -1,52 +1,156 @@
 # backend-django/api/management/commands/seed_sample.py
 from django.core.management.base import BaseCommand
-from api.models import Cattle, Diagnosis, CustomUser
+from django.db import connection, transaction
+from django.utils import timezone
+from api.models import Cattle, Diagnosis, CustomUser, _pack_preds
 from api.ml_client import call_inference
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 
+# must not exceed the ml_client session pool size (pool_maxsize=32)
+INFERENCE_WORKERS = 8
+
+# rows per multi-row INSERT in --raw mode
+RAW_PAGE_SIZE = 1000
+
+def _symptom(i):
+    return f"auto-seed symptom {i}"
+
 class Command(BaseCommand):
-    help = "Seed sample cattle and diagnoses (10 each)."
+    help = "Seed sample cattle and diagnoses (10 each by default)."
 
-    def handle(self, *args, **options):
-        owner = CustomUser.objects.filter(is_superuser=True).first() or CustomUser.objects.first()
-        if not owner:
-            self.stdout.write(self.style.ERROR("No user found. Run createsuperuser first."))
-            sys.exit(1)
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10, help="Number of cattle/diagnoses to seed.")
+        parser.add_argument(
+            "--raw",
+            action="store_true",
+            help="Insert with multi-row INSERT ... VALUES via psycopg2 execute_values (PostgreSQL only).",
+        )
 
-        self.stdout.write(f"Using owner: {owner.username} ({owner.id})")
-        created = []
-        for i in range(1, 11):
-            tag = f"C-TST-{100+i}"
-            name = f"TestCow{i}"
-            c, _ = Cattle.objects.get_or_create(
-                tag_number=tag,
-                defaults={
-                    "name": name,
-                    "breed": "mixed",
-                    "age_years": 2 + (i % 6),
-                    "weight_kg": 200 + i * 5,
-                    "owner": owner
-                }
+    def _insert_cattle_raw(self, rows):
+        from psycopg2.extras import execute_values
+
+        with connection.cursor() as cursor:
+            execute_values(
+                cursor,
+                f"INSERT INTO {Cattle._meta.db_table} (tag_number, name, breed, age_years, weight_kg, owner_id) "
+                "VALUES %s ON CONFLICT DO NOTHING",
+                rows,
+                page_size=RAW_PAGE_SIZE,
+            )
+
+    def _insert_diagnoses_raw(self, diagnoses):
+        from psycopg2.extras import execute_values, Json
+
+        now = timezone.now()
+        rows = [
+            (
+                d.cattle_id, d.submitted_by_id, d.symptom_text, Json(d.predictions), Json(d.top_prediction),
+                d.confidence, d.severity, d.recommendation, now, d.status, d.review_status,
+            )
+            for d in diagnoses
+        ]
+        with connection.cursor() as cursor:
+            ids = execute_values(
+                cursor,
+                f"INSERT INTO {Diagnosis._meta.db_table} (cattle_id, submitted_by_id, symptom_text, predictions, "
+                "top_prediction, confidence, severity, recommendation, created_at, status, review_status) "
+                "VALUES %s RETURNING id",
+                rows,
+                page_size=RAW_PAGE_SIZE,
+                fetch=True,
             )
-            created.append(c)
+        for d, (pk,) in zip(diagnoses, ids):
+            d.id = pk
+            d.created_at = now
+
+    def _infer(self, tags):
+        """
+        Run inference for every tag before anything is written; returns {tag: response}.
+        The calls are I/O bound, so they run concurrently over the pooled session (rows have
+        no pk yet, so the cattle tag is used as the case id).
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=INFERENCE_WORKERS) as ex:
+            futs = {
+                ex.submit(call_inference, symptom_text=_symptom(i), image_paths=None, case_id=tag): tag
+                for i, tag in enumerate(tags, start=1)
+            }
+            for fut in as_completed(futs):
+                tag = futs[fut]
+                try:
+                    results[tag] = fut.result()
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f"call_inference failed for {tag}, using mock: {e}"))
+                    results[tag] = {"predictions":[{"disease":"healthy","score":0.5}], "top":{"disease":"healthy","score":0.5}, "confidence":0.5, "explanation_text":"mock"}
+        return results
+
+    def _seed(self, owner, tags, results, raw):
+        """Create the sample cattle and their diagnoses from results; returns the saved diagnoses."""
+        existing = set(Cattle.objects.filter(tag_number__in=tags).values_list("tag_number", flat=True))
+        new = [
+            (tag, f"TestCow{i}", "mixed", 2 + (i % 6), 200 + i * 5)
+            for i, tag in enumerate(tags, start=1)
+            if tag not in existing
+        ]
+        if raw:
+            self._insert_cattle_raw([row + (owner.id,) for row in new])
+        else:
+            Cattle.objects.bulk_create(
+                [
+                    Cattle(tag_number=t, name=n, breed=b, age_years=a, weight_kg=w, owner=owner)
+                    for t, n, b, a, w in new
+                ],
+                ignore_conflicts=True,
+                batch_size=100,
+            )
+        # re-fetch so every row carries its pk (ignore_conflicts does not set them)
+        by_tag = {c.tag_number: c for c in Cattle.objects.filter(tag_number__in=tags)}
+        created = [by_tag[t] for t in tags if t in by_tag]
 
         self.stdout.write(self.style.SUCCESS(f"Created/confirmed {len(created)} cattle."))
 
+        # build diagnoses in memory; they are inserted in one batch below
+        diagnoses = []
         for i, c in enumerate(created, start=1):
-            d = Diagnosis.objects.create(cattle=c, submitted_by=owner, symptom_text=f"auto-seed symptom {i}", status="pending")
-            try:
-                resp = call_inference(symptom_text=d.symptom_text, image_paths=None, case_id=str(d.id))
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f"call_inference failed for {d.id}, using mock: {e}"))
-                resp = {"predictions":[{"disease":"healthy","score":0.5}], "top":{"disease":"healthy","score":0.5}, "confidence":0.5, "explanation_text":"mock"}
-
-            d.predictions = resp.get("predictions")
+            resp = results[c.tag_number]
+            d = Diagnosis(cattle=c, submitted_by=owner, symptom_text=_symptom(i), status="completed")
+            # bulk_create bypasses Diagnosis.save(), so pack here
+            d.predictions = _pack_preds(resp.get("predictions"))
             d.top_prediction = resp.get("top")
             d.confidence = float(resp.get("confidence") or resp.get("top", {}).get("score", 0.0) or 0.0)
             d.severity = resp.get("severity") or ("high" if d.confidence>0.8 else "medium" if d.confidence>0.5 else "low")
             d.recommendation = resp.get("explanation_text") or resp.get("recommendation","")
-            d.status = "completed"
-            d.save()
-            self.stdout.write(self.style.SUCCESS(f"Saved diagnosis {d.id} for {c.tag_number}"))
+            diagnoses.append(d)
+
+        if raw:
+            self._insert_diagnoses_raw(diagnoses)
+        else:
+            Diagnosis.objects.bulk_create(diagnoses, batch_size=100)
+        return diagnoses
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        raw = options["raw"]
+        if raw and connection.vendor != "postgresql":
+            self.stdout.write(self.style.WARNING("--raw needs PostgreSQL; falling back to bulk_create."))
+            raw = False
+
+        owner = CustomUser.objects.filter(is_superuser=True).first() or CustomUser.objects.first()
+        if not owner:
+            self.stdout.write(self.style.ERROR("No user found. Run createsuperuser first."))
+            sys.exit(1)
+
+        self.stdout.write(f"Using owner: {owner.username} ({owner.id})")
+        tags = [f"C-TST-{100+i}" for i in range(1, count + 1)]
+        # network first, outside any transaction, so no connection or locks are held
+        # while the inference calls are in flight
+        results = self._infer(tags)
+        # then one transaction (one COMMIT) for every write in the seed
+        with transaction.atomic():
+            diagnoses = self._seed(owner, tags, results, raw)
+
+        for d in diagnoses:
+            self.stdout.write(self.style.SUCCESS(f"Saved diagnosis {d.id} for {d.cattle.tag_number}"))
 
         self.stdout.write(self.style.SUCCESS(f"Done. Totals -> Cattle: {Cattle.objects.count()} Diagnoses: {Diagnosis.objects.count()}"))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-14 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_diagnosis_review_notes_diagnosis_review_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['status', '-created_at'], name='diag_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['severity'], name='diag_severity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['cattle', '-created_at'], name='diag_cattle_created_idx'),
+        ),
+    ]
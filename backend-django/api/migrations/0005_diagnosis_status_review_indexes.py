@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-14 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_diagnosis_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['status', 'severity'], name='diag_status_severity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['review_status'], name='diag_review_status_idx'),
+        ),
+    ]
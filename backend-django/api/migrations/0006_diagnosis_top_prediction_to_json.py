@@ -0,0 +1,43 @@
+import ast
+import json
+
+from django.db import migrations
+
+
+def _parse(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        try:
+            return ast.literal_eval(value)
+        except Exception:
+            return None
+
+
+def forwards(apps, schema_editor):
+    """Rewrite top_prediction values stored as a string ("{'disease': ...}") as native JSON objects."""
+    Diagnosis = apps.get_model("api", "Diagnosis")
+    pending = []
+    for d in Diagnosis.objects.only("id", "top_prediction").iterator(chunk_size=1000):
+        if not isinstance(d.top_prediction, str):
+            continue
+        parsed = _parse(d.top_prediction)
+        if isinstance(parsed, dict):
+            d.top_prediction = parsed
+            pending.append(d)
+        if len(pending) >= 500:
+            Diagnosis.objects.bulk_update(pending, ["top_prediction"])
+            pending = []
+    if pending:
+        Diagnosis.objects.bulk_update(pending, ["top_prediction"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_diagnosis_status_review_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
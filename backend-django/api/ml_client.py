@@ -7,82 +7,160 @@ Place this file at backend-django/api/ml_client.py and restart Django.
 """
 import os
 import logging
+import contextlib
 import mimetypes
+import functools
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 from urllib.parse import urlparse, urljoin
 
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 
+# Optional: orjson for faster response decoding (falls back to requests' json)
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# load the mime tables now rather than on the first upload
+mimetypes.init()
+
 # dev fallback gradcam (unchanged)
 SAMPLE_GRADCAM_PATH = getattr(settings, "SAMPLE_GRADCAM_PATH", "/mnt/data/8f8836c2-e4d4-4caf-8536-bda95d776817.png")
 
+# Shared HTTP session: keeps connections to the inference server alive between calls
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=3)
+_SESSION.mount("http://", _adapter)
+_SESSION.mount("https://", _adapter)
+
+# Inference settings, resolved once (see _refresh_settings)
+_INFERENCE_URL = "http://127.0.0.1:8001/predict"
+_INFERENCE_SECRET = "dev-secret-please-change"
+_INFERENCE_HEADERS: Optional[Dict[str, str]] = None
+_ALLOW_FALLBACK = True
+_GRADCAM_HTTP_BASE: Optional[str] = None
+
+
+def _refresh_settings() -> None:
+    """
+    (Re)read the inference settings into module constants.
+    Runs at import; call it again after overriding settings (e.g. in tests).
+    """
+    global _INFERENCE_URL, _INFERENCE_SECRET, _INFERENCE_HEADERS, _ALLOW_FALLBACK, _GRADCAM_HTTP_BASE
+    _INFERENCE_URL = getattr(settings, "INFERENCE_URL", "http://127.0.0.1:8001/predict")
+    _INFERENCE_SECRET = getattr(settings, "INFERENCE_SECRET", "dev-secret-please-change")
+    _ALLOW_FALLBACK = getattr(settings, "INFERENCE_ALLOW_FALLBACK", True)
+    # per-request headers for the inference POST only; never set on _SESSION itself
+    _INFERENCE_HEADERS = {"X-Inference-Secret": _INFERENCE_SECRET} if _INFERENCE_SECRET else None
+
+    # base for fetching gradcams over HTTP: prefer configured public base (full scheme + host)
+    base_to_try = getattr(settings, "INFERENCE_PUBLIC_BASE", None) or getattr(settings, "INFERENCE_URL", None)
+    if base_to_try:
+        # strip "/predict" if present (common)
+        base_to_try = base_to_try.rstrip("/")
+        if base_to_try.endswith("/predict"):
+            base_to_try = base_to_try[: -len("/predict")]
+    _GRADCAM_HTTP_BASE = base_to_try or None
+
+
+_refresh_settings()
+
+# Project base: settings.BASE_DIR if available, otherwise two parents up from this file
+_BASE = Path(getattr(settings, "BASE_DIR", None) or Path(__file__).resolve().parents[2])
+
+# directories where most gradcams live, in lookup priority order
+_BASE_STR = str(_BASE)
+_ML_DIR = os.path.join(_BASE_STR, "ml-inference")
+_ML_GRADCAMS = os.path.join(_ML_DIR, "gradcams")
+_GRADCAMS = os.path.join(_BASE_STR, "gradcams")
+_BACKEND_GRADCAMS = os.path.join(_BASE_STR, "backend-django", "gradcams")
+_GRADCAM_DIRS = (_ML_GRADCAMS, _GRADCAMS, _BACKEND_GRADCAMS)
+
+# per-directory {basename: path} index, rebuilt whenever the directory mtime changes
+_DIR_INDEX_CACHE: Dict[str, Tuple[float, Dict[str, str]]] = {}
+
 
 def _is_http_url(p: str) -> bool:
-    try:
-        s = urlparse(p).scheme
-        return s in ("http", "https")
-    except Exception:
-        return False
+    # prefix check instead of urlparse; schemes are case-insensitive
+    return isinstance(p, str) and p[:8].lower().startswith(("http://", "https://"))
 
 
 def _is_file_uri(p: str) -> bool:
+    return isinstance(p, str) and p[:7].lower() == "file://"
+
+
+def _dir_index(directory: str) -> Dict[str, str]:
+    """
+    Return {basename: path} for the regular files in directory (empty if it is missing).
+    Built with a single os.scandir and reused until the directory mtime changes,
+    so a gradcam written by the inference server is picked up immediately.
+    """
+    try:
+        mtime = os.stat(directory).st_mtime
+    except OSError:
+        return {}
+    hit = _DIR_INDEX_CACHE.get(directory)
+    if hit is not None and hit[0] == mtime:
+        return hit[1]
     try:
-        return urlparse(p).scheme == "file"
-    except Exception:
-        return False
+        with os.scandir(directory) as it:
+            index = {e.name: e.path for e in it if e.is_file()}
+    except OSError:
+        index = {}
+    _DIR_INDEX_CACHE[directory] = (mtime, index)
+    return index
 
 
-def _gather_candidate_paths(url: str) -> List[str]:
+@functools.lru_cache(maxsize=256)
+def _guess_mime(suffix: str) -> str:
+    """Content type for a file suffix such as '.jpg' (octet-stream if unknown)."""
+    return mimetypes.types_map.get(suffix.lower(), "application/octet-stream")
+
+
+@functools.lru_cache(maxsize=1024)
+def _gather_candidate_paths(url: str) -> Tuple[str, ...]:
     """
-    Return a list of local filesystem candidate paths to try reading the gradcam from.
+    Return a tuple of local filesystem candidate paths to try reading the gradcam from.
     This covers Unix-style names ("/gradcams/..", "/mnt/data/..."), Windows absolute paths,
     the repo's ml-inference/gradcams, repo gradcams, and a sample fallback.
+    Results are memoized per url (the tuple is immutable so it is safe to share).
     """
     candidates: List[str] = []
     if not url:
-        return candidates
+        return ()
 
     # Normalize separators
     url_norm = url.replace("\\", "/").strip()
 
-    # Project base: settings.BASE_DIR if available, otherwise two parents up from this file
-    base = getattr(settings, "BASE_DIR", None)
-    if base:
-        base = Path(base)
-    else:
-        # go up two levels: backend-django/
-        base = Path(__file__).resolve().parents[2]
+    name = os.path.basename(url_norm)
 
     # If URL looks like Windows absolute path (starts with drive letter)
-    # pathlib.Path.is_absolute handles Windows absolute paths correctly.
-    try:
-        p_obj = Path(url)
-        if p_obj.is_absolute():
-            candidates.append(str(p_obj))
-            # Also include the normalized form with forward slashes
-            candidates.append(str(Path(url_norm)))
-    except Exception:
-        pass
+    if os.path.isabs(url):
+        candidates.append(os.path.normpath(url))
+        # Also include the normalized form with forward slashes
+        candidates.append(os.path.normpath(url_norm))
 
     # Common ML server outputs (unix-like)
     if url_norm.startswith("/"):
+        rel = url_norm.lstrip("/")
         # project-root relative (strip leading slash)
-        candidates.append(str(base / url_norm.lstrip("/")))
+        candidates.append(os.path.join(_BASE_STR, rel))
         # ml-inference/gradcams/<name>
-        candidates.append(str(base / "ml-inference" / url_norm.lstrip("/")))
-        candidates.append(str(base / "ml-inference" / "gradcams" / Path(url_norm).name))
-        candidates.append(str(base / "gradcams" / Path(url_norm).name))
-        candidates.append(str(base / "backend-django" / "gradcams" / Path(url_norm).name))
+        candidates.append(os.path.join(_ML_DIR, rel))
+        candidates.append(os.path.join(_ML_GRADCAMS, name))
+        candidates.append(os.path.join(_GRADCAMS, name))
+        candidates.append(os.path.join(_BACKEND_GRADCAMS, name))
     else:
         # not starting with slash - try likely locations
-        candidates.append(str(base / "ml-inference" / Path(url_norm).name))
-        candidates.append(str(base / "gradcams" / Path(url_norm).name))
-        candidates.append(str(base / Path(url_norm).name))
-        candidates.append(str(Path(url_norm)))  # raw value (useful for Windows backslash form)
+        candidates.append(os.path.join(_ML_DIR, name))
+        candidates.append(os.path.join(_GRADCAMS, name))
+        candidates.append(os.path.join(_BASE_STR, name))
+        candidates.append(os.path.normpath(url_norm))  # raw value (useful for Windows backslash form)
 
     # add SAMPLE_GRADCAM_PATH last-resort
     if SAMPLE_GRADCAM_PATH:
@@ -97,7 +175,7 @@ def _gather_candidate_paths(url: str) -> List[str]:
         if c not in seen:
             dedup.append(c)
             seen.add(c)
-    return dedup
+    return tuple(dedup)
 
 
 def call_inference(
@@ -116,11 +194,10 @@ def call_inference(
     - Sends remote URLs (http/https) as CSV in 'image_urls'.
     - If request fails and INFERENCE_ALLOW_FALLBACK True, returns stub response.
     """
-    url = getattr(settings, "INFERENCE_URL", "http://127.0.0.1:8001/predict")
-    secret = getattr(settings, "INFERENCE_SECRET", "dev-secret-please-change")
-    allow_fallback = getattr(settings, "INFERENCE_ALLOW_FALLBACK", True)
-
-    headers = {"X-Inference-Secret": secret} if secret else {}
+    url = _INFERENCE_URL
+    # the secret goes on this POST only, never on the shared session (which also fetches
+    # gradcams from arbitrary hosts)
+    headers = _INFERENCE_HEADERS
 
     data: Dict[str, Any] = {
         "symptom_text": symptom_text or "",
@@ -130,12 +207,11 @@ def call_inference(
         "case_id": case_id or "",
     }
 
-    opened = []
-    files_arg = None
+    # (path, basename, mime); files are only opened right before the POST below
+    local_files: List[Tuple[str, str, str]] = []
 
     try:
         if image_paths:
-            files = []
             remote_urls = []
             for p in image_paths:
                 if not p:
@@ -147,36 +223,47 @@ def call_inference(
                 try:
                     # prefer absolute check
                     if os.path.isabs(p) and os.path.exists(p):
-                        fh = open(p, "rb")
-                        opened.append(fh)
-                        mtype, _ = mimetypes.guess_type(p)
-                        files.append(("file", (os.path.basename(p), fh, mtype or "application/octet-stream")))
+                        local_files.append((p, os.path.basename(p), _guess_mime(os.path.splitext(p)[1])))
                     else:
                         # try resolving relative path
                         possible = os.path.abspath(p)
                         if os.path.exists(possible):
-                            fh = open(possible, "rb")
-                            opened.append(fh)
-                            mtype, _ = mimetypes.guess_type(possible)
-                            files.append(("file", (os.path.basename(possible), fh, mtype or "application/octet-stream")))
+                            local_files.append(
+                                (possible, os.path.basename(possible), _guess_mime(os.path.splitext(possible)[1]))
+                            )
                         else:
                             logger.debug("call_inference: image path not found locally: %s", p)
                 except Exception:
                     logger.exception("call_inference: failed to attach %s", p)
-            files_arg = files if files else None
             if remote_urls:
                 data["image_urls"] = ",".join(remote_urls)
 
-        if files_arg:
-            resp = requests.post(url, headers=headers, data=data, files=files_arg, timeout=timeout)
-        else:
-            resp = requests.post(url, headers=headers, data=data, timeout=timeout)
+        # ExitStack closes every handle once the request has been sent
+        with contextlib.ExitStack() as stack:
+            files_arg = []
+            for lp, fname, mtype in local_files:
+                try:
+                    fh = stack.enter_context(open(lp, "rb", buffering=0))
+                except OSError:
+                    logger.exception("call_inference: failed to attach %s", lp)
+                    continue
+                files_arg.append(("file", (fname, fh, mtype)))
+
+            if files_arg:
+                resp = _SESSION.post(url, data=data, files=files_arg, headers=headers, timeout=timeout)
+            else:
+                resp = _SESSION.post(url, data=data, headers=headers, timeout=timeout)
 
         resp.raise_for_status()
+        if orjson is not None:
+            try:
+                return orjson.loads(resp.content)
+            except orjson.JSONDecodeError:
+                pass  # let requests raise its own (RequestException) decode error below
         return resp.json()
     except requests.RequestException as e:
         logger.exception("call_inference request failed: %s (url=%s)", e, url)
-        if not allow_fallback:
+        if not _ALLOW_FALLBACK:
             raise
         # dev fallback stub
         return {
@@ -191,17 +278,91 @@ def call_inference(
             "explanation_text": "Stub: highlighted important regions (mock).",
             "model_version": "v0.0.1-stub",
         }
-    finally:
-        for fh in opened:
-            try:
-                fh.close()
-            except Exception:
-                logger.exception("Failed closing file handle")
+
+
+def _open_local(path: str) -> Optional[BinaryIO]:
+    """
+    Open path for reading, or return None if it is missing. open() does the
+    existence check, so there is no separate stat; only unexpected OS errors are logged.
+    """
+    try:
+        return open(path, "rb")
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+    except OSError:
+        logger.exception("open_gradcam_image: failed opening %s", path)
+        return None
+
+
+class _PooledBody:
+    """
+    File-like view of a streamed response body. Closing the urllib3 response itself would
+    close the socket, so close() drains any unread bytes and releases the connection back
+    to the session pool instead.
+    """
+
+    def __init__(self, response: requests.Response):
+        self._response = response
+        self._raw = response.raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def read(self, *args, **kwargs) -> bytes:
+        return self._raw.read(*args, **kwargs)
+
+    def close(self) -> None:
+        try:
+            self._raw.drain_conn()
+            self._raw.release_conn()
+        except Exception:
+            self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_NO_SECRET_HEADER = {"X-Inference-Secret": None}
+
+
+def _open_http(url: str, timeout: int) -> Optional[BinaryIO]:
+    """
+    GET url with stream=True and return the (content-decoded) body reader on 200;
+    closing the reader returns the connection to the pool (see _PooledBody).
+    """
+    # the None value makes requests drop the header even if something sets it session-wide:
+    # gradcam urls can point at any host, so pooled GETs never carry the inference credential
+    r = _SESSION.get(url, stream=True, timeout=timeout, headers=_NO_SECRET_HEADER)
+    if r.status_code != 200:
+        logger.debug("open_gradcam_image: %s returned %s", url, r.status_code)
+        r.close()
+        return None
+    r.raw.decode_content = True
+    return _PooledBody(r)
 
 
 def download_gradcam_image(url: str, timeout: int = 20) -> Optional[bytes]:
     """
-    Robustly try to obtain bytes for a gradcam_url.
+    Return the bytes for a gradcam_url (see open_gradcam_image for the lookup order),
+    or None if it cannot be located.
+    """
+    fh = open_gradcam_image(url, timeout=timeout)
+    if fh is None:
+        return None
+    with fh:
+        data = fh.read()
+    # an empty body (e.g. a 200 with no content from the inference server) is a miss
+    return data or None
+
+
+def open_gradcam_image(url: str, timeout: int = 20) -> Optional[BinaryIO]:
+    """
+    Robustly try to open a readable binary stream for a gradcam_url.
+    The caller owns the returned handle and must close it; streaming it (e.g. via
+    django.core.files.File or FileResponse) avoids holding the whole image in memory.
     Order of attempts:
       1) HTTP(S) GET if url looks like http(s)
       2) file:// -> local open
@@ -209,7 +370,7 @@ def download_gradcam_image(url: str, timeout: int = 20) -> Optional[bytes]:
       4) try project-relative candidate paths (via _gather_candidate_paths)
       5) try to fetch from inference server: INFERENCE_PUBLIC_BASE or INFERENCE_URL (strip /predict) + url OR /gradcams/<basename>
       6) return None
-    Extensive logging included to help debug missing files.
+    Misses are logged at debug level; enable it to trace a missing file.
     """
     if not url:
         return None
@@ -217,109 +378,75 @@ def download_gradcam_image(url: str, timeout: int = 20) -> Optional[bytes]:
     url_str = str(url).strip()
     url_norm = url_str.replace("\\", "/")
 
-    logger.debug("download_gradcam_image: requested url=%s", url_str)
+    logger.debug("open_gradcam_image: requested url=%s", url_str)
 
     # 1) HTTP(S)
     if _is_http_url(url_str):
         try:
-            r = requests.get(url_str, timeout=timeout)
-            r.raise_for_status()
-            logger.info("download_gradcam_image: fetched http url %s", url_str)
-            return r.content
-        except Exception:
-            logger.exception("download_gradcam_image: failed http fetch %s", url_str)
+            fh = _open_http(url_str, timeout)
+            if fh is not None:
+                logger.info("open_gradcam_image: fetched http url %s", url_str)
+                return fh
+        except requests.RequestException as e:
+            logger.debug("open_gradcam_image: http fetch failed %s: %s", url_str, e)
             # fall through to other attempts
 
     # 2) file://
     if _is_file_uri(url_norm):
-        parsed = urlparse(url_norm)
-        local_path = parsed.path
-        try:
-            if os.path.exists(local_path):
-                with open(local_path, "rb") as fh:
-                    logger.info("download_gradcam_image: read file:// path %s", local_path)
-                    return fh.read()
-            logger.warning("download_gradcam_image: file:// path not found %s", local_path)
-        except Exception:
-            logger.exception("download_gradcam_image: failed reading file:// path %s", local_path)
+        local_path = urlparse(url_norm).path
+        fh = _open_local(local_path)
+        if fh is not None:
+            logger.info("open_gradcam_image: read file:// path %s", local_path)
+            return fh
+        logger.debug("open_gradcam_image: file:// path not found %s", local_path)
 
     # 3) absolute path direct (handles Windows drive letters)
-    try:
-        if os.path.isabs(url_str) or os.path.isabs(url_norm):
-            direct = url_str if os.path.isabs(url_str) else url_norm
-            try:
-                if os.path.exists(direct):
-                    with open(direct, "rb") as fh:
-                        logger.info("download_gradcam_image: read absolute path %s", direct)
-                        return fh.read()
-            except Exception:
-                logger.exception("download_gradcam_image: failed reading absolute path %s", direct)
-    except Exception:
-        logger.debug("download_gradcam_image: exception while checking absolute path", exc_info=True)
-
-    # 4) candidate local paths
-    try:
-        candidates = _gather_candidate_paths(url_norm)
-        logger.debug("download_gradcam_image: candidate local paths: %s", candidates)
-        for cand in candidates:
-            try:
-                if os.path.exists(cand):
-                    with open(cand, "rb") as fh:
-                        logger.info("download_gradcam_image: found candidate file %s", cand)
-                        return fh.read()
-                else:
-                    logger.debug("download_gradcam_image: candidate does not exist %s", cand)
-            except Exception:
-                logger.debug("download_gradcam_image: candidate open failed %s", cand, exc_info=True)
-    except Exception:
-        logger.exception("download_gradcam_image: failed gathering/trying candidate paths for %s", url_norm)
+    if os.path.isabs(url_str) or os.path.isabs(url_norm):
+        direct = url_str if os.path.isabs(url_str) else url_norm
+        fh = _open_local(direct)
+        if fh is not None:
+            logger.info("open_gradcam_image: read absolute path %s", direct)
+            return fh
+
+    # 4) candidate local paths, in priority order; candidates inside the known gradcam
+    # directories are answered from that directory's cached index instead of an open() probe
+    name = os.path.basename(url_norm)
+    for cand in _gather_candidate_paths(url_norm):
+        cand_dir, cand_name = os.path.split(cand)
+        if cand_dir in _GRADCAM_DIRS:
+            hit = _dir_index(cand_dir).get(cand_name)
+            if not hit:
+                continue
+            cand = hit
+        fh = _open_local(cand)
+        if fh is not None:
+            logger.info("open_gradcam_image: found candidate file %s", cand)
+            return fh
 
     # 5) attempt to fetch from inference server using INFERENCE_PUBLIC_BASE or INFERENCE_URL
-    try:
-        # Prefer configured public base (full scheme + host)
-        public_base = getattr(settings, "INFERENCE_PUBLIC_BASE", None)
-        inference_url = getattr(settings, "INFERENCE_URL", None)
-        base_to_try = public_base or inference_url
-
-        if base_to_try:
-            # strip "/predict" if present (common)
-            base = base_to_try.rstrip("/")
-            if base.endswith("/predict"):
-                base = base[: -len("/predict")]
-
-            # If url starts with '/', join directly; otherwise try /gradcams/<basename>
-            http_candidates = []
-            if url_norm.startswith("/"):
-                http_candidates.append(base + url_norm)
-                # also try base + '/gradcams/' + basename
-                http_candidates.append(base + "/gradcams/" + Path(url_norm).name)
-            else:
-                # try base + '/gradcams/' + basename
-                http_candidates.append(base + "/gradcams/" + Path(url_norm).name)
-                # also base + '/' + url_norm
-                http_candidates.append(base + "/" + url_norm)
-
-            # remove duplicates while preserving order
-            seen = set()
-            http_candidates_clean = []
-            for h in http_candidates:
-                if h not in seen:
-                    http_candidates_clean.append(h)
-                    seen.add(h)
-
-            logger.debug("download_gradcam_image: trying inference-server HTTP candidates: %s", http_candidates_clean)
-            for hc in http_candidates_clean:
-                try:
-                    r = requests.get(hc, timeout=timeout)
-                    if r.status_code == 200 and r.content:
-                        logger.info("download_gradcam_image: fetched from inference server %s", hc)
-                        return r.content
-                    else:
-                        logger.debug("download_gradcam_image: inference-server returned %s for %s", r.status_code, hc)
-                except Exception:
-                    logger.debug("download_gradcam_image: failed http fetch %s", hc, exc_info=True)
-    except Exception:
-        logger.exception("download_gradcam_image: error while trying inference-server fetch for %s", url_norm)
+    base = _GRADCAM_HTTP_BASE
+    if base:
+        # If url starts with '/', join directly; otherwise try /gradcams/<basename>
+        http_candidates = []
+        if url_norm.startswith("/"):
+            http_candidates.append(base + url_norm)
+            # also try base + '/gradcams/' + basename
+            http_candidates.append(base + "/gradcams/" + name)
+        else:
+            # try base + '/gradcams/' + basename
+            http_candidates.append(base + "/gradcams/" + name)
+            # also base + '/' + url_norm
+            http_candidates.append(base + "/" + url_norm)
 
-    logger.warning("download_gradcam_image: Unsupported gradcam_url scheme or couldn't locate file: %s", url_str)
+        # remove duplicates while preserving order
+        for hc in dict.fromkeys(http_candidates):
+            try:
+                fh = _open_http(hc, timeout)
+                if fh is not None:
+                    logger.info("open_gradcam_image: fetched from inference server %s", hc)
+                    return fh
+            except requests.RequestException as e:
+                logger.debug("open_gradcam_image: http fetch failed %s: %s", hc, e)
+
+    logger.warning("open_gradcam_image: Unsupported gradcam_url scheme or couldn't locate file: %s", url_str)
     return None
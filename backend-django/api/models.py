@@ -4,6 +4,30 @@ from django.conf import settings
 from django.utils import timezone
 
 
+def _pack_preds(preds):
+    """
+    Compact form stored in Diagnosis.predictions:
+    [{"disease": d, "score": s}, ...] -> [[d, s], ...]; scores keep full precision.
+    Already-packed rows pass through unchanged.
+    """
+    if not isinstance(preds, list):
+        return preds
+    packed = []
+    for p in preds:
+        if isinstance(p, dict):
+            packed.append([p.get("disease"), float(p.get("score") or 0.0)])
+        else:
+            packed.append(p)
+    return packed
+
+
+def _unpack_preds(packed):
+    """Inverse of _pack_preds; tolerates legacy rows that still hold the verbose dicts."""
+    if not isinstance(packed, list):
+        return packed
+    return [p if isinstance(p, dict) else {"disease": p[0], "score": p[1]} for p in packed]
+
+
 class CustomUser(AbstractUser):
     ROLE_CHOICES = (
         ("farmer", "Farmer"),
@@ -69,7 +93,7 @@ class Diagnosis(models.Model):
     )
     symptom_text = models.TextField(blank=True)
     images = models.ManyToManyField(Media, blank=True, related_name="diagnoses")
-    predictions = models.JSONField(null=True, blank=True)  # list/dict per your app conventions
+    predictions = models.JSONField(null=True, blank=True)  # packed [[disease, score], ...] (see _pack_preds)
     top_prediction = models.JSONField(null=True, blank=True)
     confidence = models.FloatField(null=True, blank=True)
     severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES, null=True, blank=True)
@@ -95,6 +119,15 @@ class Diagnosis(models.Model):
     review_status = models.CharField(max_length=20, choices=REVIEW_STATUS_CHOICES, default="pending")
     review_notes = models.TextField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "-created_at"], name="diag_status_created_idx"),
+            models.Index(fields=["severity"], name="diag_severity_idx"),
+            models.Index(fields=["cattle", "-created_at"], name="diag_cattle_created_idx"),
+            models.Index(fields=["status", "severity"], name="diag_status_severity_idx"),
+            models.Index(fields=["review_status"], name="diag_review_status_idx"),
+        ]
+
     def mark_reviewed(self, user, status: str = "approved", notes: str = ""):
         """Helper to mark a diagnosis as reviewed (call from views)."""
         self.review_status = status
@@ -110,6 +143,15 @@ class Diagnosis(models.Model):
             self.status = "edited"
         self.save()
 
+    @property
+    def predictions_full(self):
+        """Predictions in the verbose [{"disease":..., "score":...}] shape used by the API."""
+        return _unpack_preds(self.predictions)
+
+    def save(self, *args, **kwargs):
+        self.predictions = _pack_preds(self.predictions)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         top = self.top_prediction or "unknown"
         # if top is dict try to show label
@@ -23,6 +23,11 @@ class IsOwnerOrVetAdmin(permissions.BasePermission):
       - vets and admins have full access
       - owners (cattle owner or submitted_by) can access their objects
       - authenticated users can list/create (adjustable)
+
+    Ownership is checked through FK ids (owner_id / submitted_by_id), so the only
+    related row ever touched is Diagnosis.cattle. Viewsets using this permission
+    MUST chain .select_related("cattle") so that access does not cost an extra
+    query per object.
     """
 
     def has_permission(self, request, view):
@@ -34,35 +39,36 @@ class IsOwnerOrVetAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         user = request.user
 
-        # superuser always allowed
-        if getattr(user, "is_superuser", False):
+        # superuser / vets / admins always allowed
+        is_priv = getattr(user, "is_superuser", False) or getattr(user, "role", None) in ("vet", "admin")
+        if is_priv:
             return True
 
-        # vets/admins allowed
-        role = getattr(user, "role", None)
-        if role in ("vet", "admin"):
-            return True
+        user_id = user.pk
+        submitted_by_id = getattr(obj, "submitted_by_id", None)
+        cattle = getattr(obj, "cattle_id", None) and obj.cattle
+        cattle_owner_id = getattr(cattle, "owner_id", None) if cattle is not None else None
 
         # Safe methods: allow authenticated users to read if they own the object or are related
         if request.method in permissions.SAFE_METHODS:
             # For Cattle model: check owner
-            if hasattr(obj, "owner"):
-                return obj.owner == user
+            if hasattr(obj, "owner_id"):
+                return obj.owner_id == user_id
             # For Diagnosis model: allow if submitted_by or cattle.owner matches user
-            if hasattr(obj, "submitted_by"):
-                if obj.submitted_by == user:
+            if hasattr(obj, "submitted_by_id"):
+                if submitted_by_id == user_id:
                     return True
-                if hasattr(obj, "cattle") and getattr(obj.cattle, "owner", None) == user:
+                if cattle_owner_id == user_id:
                     return True
             # default deny for safe methods if no relation
             return False
 
         # Non-safe methods (write/update/delete):
         # - allow if the user created/submitted it
-        if hasattr(obj, "submitted_by") and obj.submitted_by == user:
+        if hasattr(obj, "submitted_by_id") and submitted_by_id == user_id:
             return True
         # - allow if the user is cattle owner
-        if hasattr(obj, "cattle") and getattr(obj.cattle, "owner", None) == user:
+        if cattle_owner_id is not None and cattle_owner_id == user_id:
             return True
 
         # otherwise deny
@@ -0,0 +1,27 @@
+# api/renderers.py
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Optional: orjson for faster response encoding (falls back to DRF's JSONRenderer)
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson. Types orjson does not know (Decimal,
+    lazy strings, ...) go through DRF's own encoder; indented (browsable/?indent)
+    output is left to the stdlib path.
+    """
+    _default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        return orjson.dumps(data, default=self._default, option=_OPTIONS)
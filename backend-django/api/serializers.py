@@ -1,8 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.fields import get_error_detail
+
+# Optional: fastjsonschema for compiled validation of review predictions
+try:
+    import fastjsonschema  # type: ignore
+except Exception:
+    fastjsonschema = None
 from .models import CustomUser, Cattle, Diagnosis, Media, DiagnosisAudit
 
 
+# upper bound on threads used to verify a multi-image upload
+IMAGE_VALIDATION_WORKERS = int(getattr(settings, "IMAGE_VALIDATION_WORKERS", 8))
+
+
+def save_uploaded_images(diagnosis: Diagnosis, files: List[Any]) -> List[Media]:
+    """
+    Store uploaded files as Media attached to diagnosis and return them. Files still go to
+    storage one by one; the rows and M2M links are batched. Shared by
+    DiagnosisSerializer.create and DiagnosisViewSet.create; call inside a transaction.
+    Thumbnails are queued on commit when THUMBNAILS_ASYNC is on.
+    """
+    medias = []
+    for f in files:
+        media = Media()
+        media.file.save(f.name, f, save=False)
+        medias.append(media)
+    if medias:
+        Media.objects.bulk_create(medias)
+        diagnosis.images.add(*medias)
+
+        if getattr(settings, "THUMBNAILS_ASYNC", False):
+            from .tasks import generate_thumbnails
+
+            if generate_thumbnails is not None:
+                # Pillow work happens on a worker, never in the request; queued only once
+                # the rows are committed, so the worker can see them
+                media_ids = [m.id for m in medias]
+                transaction.on_commit(lambda: generate_thumbnails.delay(media_ids))
+    return medias
+
+
+class ParallelListField(serializers.ListField):
+    """
+    ListField that validates its items concurrently. Meant for image uploads:
+    Pillow releases the GIL while decoding, so verifying N images overlaps.
+    Errors are reported per index exactly like ListField.
+    """
+    def run_child_validation(self, data):
+        if len(data) < 2:
+            return super().run_child_validation(data)
+
+        with ThreadPoolExecutor(max_workers=min(IMAGE_VALIDATION_WORKERS, len(data))) as ex:
+            futures = [ex.submit(self.child.run_validation, item) for item in data]
+
+        result = []
+        errors = {}
+        for idx, fut in enumerate(futures):
+            try:
+                result.append(fut.result())
+            except serializers.ValidationError as e:
+                errors[idx] = e.detail
+            except DjangoValidationError as e:
+                errors[idx] = get_error_detail(e)
+
+        if not errors:
+            return result
+        raise serializers.ValidationError(errors)
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin taking an optional fields=(...) kwarg that restricts the
+    output to that subset of the declared fields (unknown names are ignored).
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class MediaSerializer(serializers.ModelSerializer):
     """Serializer for uploaded media files associated with Diagnoses."""
     class Meta:
@@ -39,15 +122,6 @@ class UserSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
-    def update(self, instance: CustomUser, validated_data: Dict[str, Any]) -> CustomUser:
-        password = validated_data.pop("password", None)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        if password:
-            instance.set_password(password)
-        instance.save()
-        return instance
-
 
 class CattleSerializer(serializers.ModelSerializer):
     """Serializer for Cattle model. 'owner' is read-only (set from request.user in views)."""
@@ -68,13 +142,14 @@ class CattleSerializer(serializers.ModelSerializer):
         read_only_fields = ("id", "owner")
 
 
-class DiagnosisSerializer(serializers.ModelSerializer):
+class DiagnosisSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Diagnosis.
     Handles uploaded images and read-only fields for vet review.
+    Pass fields=(...) to render only a subset (see DiagnosisViewSet ?fields=).
     """
     images = MediaSerializer(many=True, read_only=True)
-    uploaded_images = serializers.ListField(
+    uploaded_images = ParallelListField(
         child=serializers.ImageField(
             max_length=None, allow_empty_file=False, use_url=False
         ),
@@ -84,12 +159,16 @@ class DiagnosisSerializer(serializers.ModelSerializer):
     )
     cattle_id = serializers.PrimaryKeyRelatedField(
         source="cattle",
-        queryset=Cattle.objects.all(),
+        # DiagnosisViewSet.create reads breed/age/weight for inference and renders this
+        # instance back through CattleSerializer, so load exactly those columns
+        queryset=Cattle.objects.only(*CattleSerializer.Meta.fields),
         write_only=True,
         help_text="Primary key of the cattle related to this diagnosis.",
     )
     cattle = CattleSerializer(read_only=True)
     submitted_by = serializers.PrimaryKeyRelatedField(read_only=True)
+    # stored packed; always exposed in the verbose shape
+    predictions = serializers.ReadOnlyField(source="predictions_full")
 
     # Review fields
     reviewed_by = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -143,14 +222,31 @@ class DiagnosisSerializer(serializers.ModelSerializer):
             cattle=cattle, submitted_by=user, **validated_data
         )
 
-        for uploaded_file in uploaded_images:
-            media = Media.objects.create(file=uploaded_file)
-            diagnosis.images.add(media)
+        if uploaded_images:
+            save_uploaded_images(diagnosis, uploaded_images)
+
+        if getattr(settings, "INFERENCE_ASYNC", False):
+            from .tasks import complete_diagnosis_task
 
-        diagnosis.save()
+            if complete_diagnosis_task is not None:
+                # same pipeline as DiagnosisViewSet.create (postprocessing, treatment, gradcam);
+                # queue only once the row is committed, so the worker can see it
+                transaction.on_commit(lambda: complete_diagnosis_task.delay(diagnosis.id))
         return diagnosis
 
 
+# review overrides are stored via _pack_preds, which keeps exactly disease + score
+_PREDICTIONS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"disease": {"type": "string"}, "score": {"type": "number"}},
+        "required": ["disease", "score"],
+    },
+}
+_validate_predictions = fastjsonschema.compile(_PREDICTIONS_SCHEMA) if fastjsonschema is not None else None
+
+
 class DiagnosisReviewSerializer(serializers.Serializer):
     """
     Serializer for veterinary review of a diagnosis.
@@ -166,5 +262,27 @@ class DiagnosisReviewSerializer(serializers.Serializer):
     )
     review_notes = serializers.CharField(required=False, allow_blank=True)
     top_prediction = serializers.DictField(child=serializers.CharField(), required=False)
-    predictions = serializers.ListField(child=serializers.DictField(), required=False)
+    # one schema check over the whole list instead of a DictField per item
+    predictions = serializers.JSONField(required=False)
     recommendation = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_predictions(self, value):
+        if value is None:
+            return value
+        if _validate_predictions is not None:
+            try:
+                _validate_predictions(value)
+            except fastjsonschema.JsonSchemaException as e:
+                raise serializers.ValidationError(e.message)
+            return value
+        if not isinstance(value, list):
+            raise serializers.ValidationError("predictions must be a list.")
+        for p in value:
+            if not (
+                isinstance(p, dict)
+                and isinstance(p.get("disease"), str)
+                and isinstance(p.get("score"), (int, float))
+                and not isinstance(p.get("score"), bool)
+            ):
+                raise serializers.ValidationError("each prediction needs a string disease and a numeric score.")
+        return value
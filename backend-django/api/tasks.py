@@ -0,0 +1,90 @@
+# api/tasks.py
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+
+from .models import Diagnosis, DiagnosisAudit, Media
+
+# Optional: celery (falls back to a plain function that is never queued)
+try:
+    from celery import shared_task  # type: ignore
+except Exception:
+    shared_task = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (256, 256)
+
+
+def _complete_diagnosis(diagnosis_id):
+    """Full create pipeline (inference, postprocessing, treatment, gradcam) for a pending diagnosis."""
+    # views imports this module at load time
+    from .views import complete_diagnosis
+
+    diag = Diagnosis.objects.select_related("cattle").get(pk=diagnosis_id)
+    image_paths = []
+    for media in diag.images.all():
+        try:
+            image_paths.append(media.file.path)
+        except (NotImplementedError, ValueError):
+            # remote storage without local paths
+            pass
+    complete_diagnosis(diag, image_paths)
+
+
+def _generate_thumbnails(media_ids):
+    """Render a THUMBNAIL_SIZE JPEG for each Media and store them with one bulk_update."""
+    from PIL import Image
+
+    medias = list(Media.objects.filter(pk__in=media_ids, thumbnail=""))
+    done = []
+    for m in medias:
+        try:
+            with m.file.open("rb") as fh, Image.open(fh) as img:
+                img.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+                buf = io.BytesIO()
+                img.convert("RGB").save(buf, "JPEG", quality=85)
+        except Exception:
+            logger.exception("generate_thumbnails: failed for media %s", m.pk)
+            continue
+        name = os.path.splitext(os.path.basename(m.file.name))[0] + "_thumb.jpg"
+        m.thumbnail.save(name, ContentFile(buf.getvalue()), save=False)
+        done.append(m)
+    if done:
+        Media.objects.bulk_update(done, ["thumbnail"])
+
+
+def _record_audit(diagnosis_id, actor_id, action, before, after, notes):
+    DiagnosisAudit.objects.create(
+        diagnosis_id=diagnosis_id,
+        actor_id=actor_id,
+        action=action,
+        before=before,
+        after=after,
+        notes=notes,
+    )
+
+
+if shared_task is not None:
+    @shared_task(bind=True, max_retries=3)
+    def complete_diagnosis_task(self, diagnosis_id):
+        try:
+            _complete_diagnosis(diagnosis_id)
+        except Diagnosis.DoesNotExist:
+            logger.warning("complete_diagnosis_task: diagnosis %s no longer exists", diagnosis_id)
+        except Exception as exc:
+            raise self.retry(exc=exc, countdown=2 ** self.request.retries)
+
+    @shared_task
+    def generate_thumbnails(media_ids):
+        _generate_thumbnails(media_ids)
+
+    @shared_task
+    def record_audit(diagnosis_id, actor_id, action, before, after, notes):
+        _record_audit(diagnosis_id, actor_id, action, before, after, notes)
+else:
+    complete_diagnosis_task = None
+    generate_thumbnails = None
+    record_audit = None
@@ -0,0 +1,176 @@
+# backend-django/api/tests.py
+import importlib
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import serializers as api_serializers
+from api.views import DiagnosisViewSet
+from api.models import Cattle, CustomUser, Diagnosis, _pack_preds, _unpack_preds
+
+FAKE_RESPONSE = {
+    "predictions": [{"disease": "lumpy", "score": 0.912345678}, {"disease": "healthy", "score": 0.05}],
+    "top": {"disease": "lumpy", "score": 0.912345678},
+    "confidence": 0.912345678,
+}
+
+
+class PackPredsTests(TestCase):
+    def test_round_trip_keeps_full_precision(self):
+        preds = FAKE_RESPONSE["predictions"]
+        packed = _pack_preds(preds)
+        self.assertEqual(packed, [["lumpy", 0.912345678], ["healthy", 0.05]])
+        self.assertEqual(_unpack_preds(packed), preds)
+
+    def test_packed_and_non_list_values_pass_through(self):
+        self.assertEqual(_pack_preds([["lumpy", 0.5]]), [["lumpy", 0.5]])
+        self.assertIsNone(_pack_preds(None))
+        # legacy rows still hold the verbose dicts
+        self.assertEqual(_unpack_preds([{"disease": "x", "score": 1.0}]), [{"disease": "x", "score": 1.0}])
+
+    def test_save_packs_predictions(self):
+        owner = CustomUser.objects.create_user("f", email="f@example.com", password="pw")
+        cattle = Cattle.objects.create(tag_number="T-1", owner=owner)
+        d = Diagnosis.objects.create(cattle=cattle, submitted_by=owner, predictions=FAKE_RESPONSE["predictions"])
+        d.refresh_from_db()
+        self.assertEqual(d.predictions, [["lumpy", 0.912345678], ["healthy", 0.05]])
+        self.assertEqual(d.predictions_full, FAKE_RESPONSE["predictions"])
+
+
+@mock.patch("api.views.SAMPLE_GRADCAM_PATH", None)
+@mock.patch("api.views.call_inference", return_value=FAKE_RESPONSE)
+class DiagnosisApiTests(TestCase):
+    def setUp(self):
+        self.farmer = CustomUser.objects.create_user("farmer", email="farmer@example.com", password="pw")
+        self.vet = CustomUser.objects.create_user("vet", email="vet@example.com", password="pw", role="vet")
+        self.cattle = Cattle.objects.create(tag_number="T-1", owner=self.farmer, breed="mixed", weight_kg=300)
+        self.client = APIClient()
+        self.client.force_authenticate(self.farmer)
+
+    def _create(self):
+        return self.client.post(
+            "/api/diagnosis/", {"cattle_id": self.cattle.id, "symptom_text": "skin nodules"}, format="json"
+        )
+
+    def _diagnosis(self, **kwargs):
+        return Diagnosis.objects.create(
+            cattle=self.cattle, submitted_by=self.farmer, predictions=FAKE_RESPONSE["predictions"],
+            top_prediction=FAKE_RESPONSE["top"], confidence=0.9, severity="high",
+            recommendation="rest", status="completed", **kwargs
+        )
+
+    def test_create_runs_inference_and_returns_201(self, call_inference):
+        resp = self._create()
+        self.assertEqual(resp.status_code, 201)
+        data = resp.json()
+        self.assertEqual(data["status"], "completed")
+        # postprocessing recalibrates the scores; the diseases and their order survive
+        self.assertEqual([p["disease"] for p in data["predictions"]], ["lumpy", "healthy"])
+        self.assertIn("Suggested treatment", data["recommendation"])
+        self.assertEqual(data["_ml"]["predictions_raw"], FAKE_RESPONSE["predictions"])
+        call_inference.assert_called_once()
+
+        d = Diagnosis.objects.get(pk=data["id"])
+        self.assertEqual(d.status, "completed")
+        self.assertEqual(d.predictions, _pack_preds(data["predictions"]))
+
+    def test_create_returns_503_when_inference_fails(self, call_inference):
+        call_inference.side_effect = RuntimeError("inference down")
+        resp = self._create()
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(Diagnosis.objects.get().status, "failed")
+
+    @override_settings(ASYNC_DIAGNOSIS=True)
+    def test_async_create_returns_202_and_queues_on_commit(self, call_inference):
+        with mock.patch("api.views.complete_diagnosis_task") as task:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                resp = self._create()
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.json()["status"], "pending")
+        self.assertEqual(len(callbacks), 1)
+        task.delay.assert_called_once_with(resp.json()["id"])
+        call_inference.assert_not_called()
+
+    def test_list_fields_and_compact(self, call_inference):
+        self._diagnosis()
+
+        resp = self.client.get("/api/diagnosis/", {"fields": "id,status"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(set(resp.json()[0]), {"id", "status"})
+
+        resp = self.client.get("/api/diagnosis/", {"compact": "1"})
+        self.assertEqual(resp.status_code, 200)
+        row = resp.json()[0]
+        self.assertEqual(set(row), set(DiagnosisViewSet.LIST_SUMMARY_FIELDS))
+        self.assertNotIn("predictions", row)
+
+        resp = self.client.get("/api/diagnosis/")
+        self.assertEqual(resp.json()[0]["predictions"], FAKE_RESPONSE["predictions"])
+
+    def test_list_hides_other_owners_rows(self, call_inference):
+        self._diagnosis()
+        other = CustomUser.objects.create_user("other", email="other@example.com", password="pw")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get("/api/diagnosis/").json(), [])
+
+    def test_review_applies_overrides(self, call_inference):
+        d = self._diagnosis()
+        self.client.force_authenticate(self.vet)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                f"/api/diagnosis/{d.id}/review/",
+                {"review_status": "edited", "predictions": [{"disease": "healthy", "score": 0.7}]},
+                format="json",
+            )
+        self.assertEqual(resp.status_code, 200)
+        d.refresh_from_db()
+        self.assertEqual(d.review_status, "edited")
+        self.assertEqual(d.reviewed_by, self.vet)
+        self.assertEqual(d.predictions, [["healthy", 0.7]])
+        audit = d.audits.get()
+        self.assertEqual((audit.action, audit.actor), ("edited", self.vet))
+
+    def test_review_rejected_for_farmers(self, call_inference):
+        d = self._diagnosis()
+        resp = self.client.post(f"/api/diagnosis/{d.id}/review/", {"review_status": "approved"}, format="json")
+        self.assertEqual(resp.status_code, 403)
+
+    def test_review_rejects_bad_predictions(self, call_inference):
+        d = self._diagnosis()
+        self.client.force_authenticate(self.vet)
+        bad = [{"disease": "healthy"}, {"disease": 3, "score": "high"}]
+        for validator in (api_serializers._validate_predictions, None):
+            with self.subTest(fastjsonschema=validator is not None), \
+                    mock.patch.object(api_serializers, "_validate_predictions", validator):
+                for payload in (bad, {"disease": "healthy", "score": 0.7}):
+                    resp = self.client.post(
+                        f"/api/diagnosis/{d.id}/review/",
+                        {"review_status": "edited", "predictions": payload},
+                        format="json",
+                    )
+                    self.assertEqual(resp.status_code, 400)
+        d.refresh_from_db()
+        self.assertEqual(d.review_status, "pending")
+
+
+class TopPredictionMigrationTests(TestCase):
+    migration = importlib.import_module("api.migrations.0006_diagnosis_top_prediction_to_json")
+
+    def test_forwards_parses_string_values(self):
+        owner = CustomUser.objects.create_user("f", email="f@example.com", password="pw")
+        cattle = Cattle.objects.create(tag_number="T-1", owner=owner)
+        as_repr = Diagnosis.objects.create(cattle=cattle, top_prediction="{'disease': 'lumpy', 'score': 0.9}")
+        as_json = Diagnosis.objects.create(cattle=cattle, top_prediction='{"disease": "healthy", "score": 0.4}')
+        native = Diagnosis.objects.create(cattle=cattle, top_prediction={"disease": "x", "score": 0.1})
+        garbage = Diagnosis.objects.create(cattle=cattle, top_prediction="not a dict")
+
+        self.migration.forwards(django_apps, None)
+
+        for d in (as_repr, as_json, native, garbage):
+            d.refresh_from_db()
+        self.assertEqual(as_repr.top_prediction, {"disease": "lumpy", "score": 0.9})
+        self.assertEqual(as_json.top_prediction, {"disease": "healthy", "score": 0.4})
+        self.assertEqual(native.top_prediction, {"disease": "x", "score": 0.1})
+        self.assertEqual(garbage.top_prediction, "not a dict")
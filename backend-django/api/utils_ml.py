@@ -1,26 +1,86 @@
 # api/utils_ml.py
 import os
+import shutil
+import importlib.util
 import requests
-from django.core.files.base import ContentFile
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
 from django.conf import settings
 from .models import Media, Diagnosis
 import logging
 
+# Optional: httpx for an HTTP/2-capable inference client (falls back to the requests session)
+try:
+    import httpx  # type: ignore
+except Exception:
+    httpx = None
+
 logger = logging.getLogger(__name__)
 
 INFERENCE_URL = getattr(settings, "INFERENCE_URL", "http://127.0.0.1:8001/predict")
 INFERENCE_SECRET = getattr(settings, "INFERENCE_SECRET", "dev-secret-please-change")
 
+# (connect, read) timeouts in seconds
+INFERENCE_TIMEOUT = (3, 30)
+GRADCAM_TIMEOUT = (3, 20)
+
+# one pooled keep-alive session for every call to the inference server
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504]),
+)
+_SESSION.mount("http://", _adapter)
+_SESSION.mount("https://", _adapter)
+
+# HTTP/2 is negotiated over TLS (ALPN) and needs the h2 package; plain http:// stays on HTTP/1.1
+_INFERENCE = None
+if httpx is not None:
+    _INFERENCE = httpx.Client(
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=httpx.Timeout(INFERENCE_TIMEOUT[1], connect=INFERENCE_TIMEOUT[0]),
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        headers={"X-Inference-Secret": INFERENCE_SECRET},
+    )
+
 def call_inference_stub(symptom_text: str, case_id: str = None, breed=None, age=None, weight=None):
     """
     Calls the FastAPI stub and returns parsed JSON.
     """
-    headers = {"X-Inference-Secret": INFERENCE_SECRET}
     data = {"symptom_text": symptom_text or "", "case_id": case_id or ""}
-    r = requests.post(INFERENCE_URL, data=data, headers=headers, timeout=30)
+    if _INFERENCE is not None:
+        r = _INFERENCE.post(INFERENCE_URL, data=data)
+    else:
+        headers = {"X-Inference-Secret": INFERENCE_SECRET}
+        r = _SESSION.post(INFERENCE_URL, data=data, headers=headers, timeout=INFERENCE_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
+def _link_into_storage(media: Media, local_path: str) -> bool:
+    """
+    Place local_path into media.file without reading it through Python: hard-link
+    it into FileSystemStorage (copyfile across filesystems). Returns False when the
+    storage is not local or the name was taken meanwhile; the caller then streams it.
+    """
+    storage = media.file.storage
+    if not isinstance(storage, FileSystemStorage):
+        return False
+    name = storage.get_available_name(media.file.field.generate_filename(media, os.path.basename(local_path)))
+    target = storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(local_path, target)
+    except FileExistsError:
+        return False
+    except OSError:
+        shutil.copyfile(local_path, target)
+    media.file.name = name
+    media.save()
+    return True
+
 def save_gradcam_to_media(diag: Diagnosis, gradcam_path: str):
     """
     Save a gradcam given as a local path into the Django Media model and attach to Diagnosis.
@@ -29,25 +89,24 @@ def save_gradcam_to_media(diag: Diagnosis, gradcam_path: str):
     try:
         if not gradcam_path:
             return None
-        # if URL already (http/https) you would fetch it (requests.get) and save content.
+        # the source is streamed into storage in chunks rather than read into memory first
+        media = Media()
         if gradcam_path.startswith("http://") or gradcam_path.startswith("https://"):
             # fetch remote file
-            resp = requests.get(gradcam_path, timeout=20)
-            resp.raise_for_status()
-            content = resp.content
-            fname = os.path.basename(gradcam_path)
+            with _SESSION.get(gradcam_path, timeout=GRADCAM_TIMEOUT, stream=True) as resp:
+                resp.raise_for_status()
+                resp.raw.decode_content = True
+                media.file.save(os.path.basename(gradcam_path), File(resp.raw), save=True)
         else:
             # treat as local path
             local_path = gradcam_path
             if not os.path.exists(local_path):
                 logger.warning("Gradcam local path does not exist: %s", local_path)
                 return None
-            with open(local_path, "rb") as fh:
-                content = fh.read()
-            fname = os.path.basename(local_path)
+            if not _link_into_storage(media, local_path):
+                with open(local_path, "rb") as fh:
+                    media.file.save(os.path.basename(local_path), File(fh), save=True)
 
-        media = Media()
-        media.file.save(fname, ContentFile(content), save=True)
         # optional: store source path in a field if you have one
         try:
             diag.images.add(media)
@@ -1,23 +1,111 @@
 # api/utils_treatment.py
 from pathlib import Path
+from types import MappingProxyType
+import codecs
+import functools
 import json
 from django.conf import settings
 
-TREATMENT_MAP = None
-def load_treatment_map():
-    global TREATMENT_MAP
-    if TREATMENT_MAP is None:
-        p = Path(settings.BASE_DIR) / "metadata" / "treatment_map.json"
-        if p.exists():
-            TREATMENT_MAP = json.loads(p.read_text(encoding="utf8"))
+# Optional: orjson for faster JSON decoding (falls back to stdlib json)
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+_PATH = Path(settings.BASE_DIR) / "metadata" / "treatment_map.json"
+
+
+def _read_treatment_map(path: Path) -> dict:
+    try:
+        raw = path.read_bytes()
+    except OSError:
+        return {}
+    # the shipped file is saved with a UTF-8 BOM, which neither decoder accepts
+    if raw.startswith(codecs.BOM_UTF8):
+        raw = raw[len(codecs.BOM_UTF8):]
+    try:
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _flatten(tmap):
+    """
+    Entries are either plain text or {"default": ..., "by_breed": {breed: ...}}.
+    Returns ({(disease, breed): text}, {disease: default_text}) so lookup() is one get each.
+    """
+    flat, default = {}, {}
+    for disease, entry in tmap.items():
+        if isinstance(entry, dict):
+            for breed, text in (entry.get("by_breed") or {}).items():
+                flat[(disease, breed)] = text
+            default[disease] = entry.get("default")
         else:
-            TREATMENT_MAP = {}
-    return TREATMENT_MAP
+            default[disease] = entry
+    return flat, default
 
-def compute_dosage(weight_kg, mg_per_kg):
+
+def _load(path: Path):
+    """(mtime, read-only map, flat, default) for path; mtime is None if the file is missing."""
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        mtime = None
+    tmap = MappingProxyType(_read_treatment_map(path))
+    return (mtime, tmap) + _flatten(tmap)
+
+
+# loaded once at import; the map is read-only so callers cannot mutate it
+_STATE = _load(_PATH)
+
+
+def _current():
+    """The loaded state; in DEBUG it is re-read when the file's mtime changes."""
+    global _STATE
+    if settings.DEBUG:
+        try:
+            mtime = _PATH.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime != _STATE[0]:
+            _STATE = _load(_PATH)
+    return _STATE
+
+
+def load_treatment_map():
+    return _current()[1]
+
+
+def lookup(disease, breed=None):
+    """Treatment text for disease, preferring a breed-specific entry when one exists."""
+    _, _, flat, default = _current()
+    return flat.get((disease, breed)) or default.get(disease)
+
+
+_FMT = "%.0f mg total (%s mg/kg × %s kg)"
+
+
+def _safe_float(value):
+    if isinstance(value, str):
+        # accept decimal commas ("350,5")
+        value = value.replace(",", ".")
     try:
-        w = float(weight_kg)
+        return float(value)
     except (TypeError, ValueError):
         return None
-    total_mg = mg_per_kg * w
-    return f"{total_mg:.0f} mg total ({mg_per_kg} mg/kg × {w} kg)"
+
+
+@functools.lru_cache(maxsize=4096, typed=True)
+def _dosage_text(w, mg_per_kg):
+    # herds repeat the same (weight, dose) pairs; keyed on the parsed float weight. typed:
+    # mg_per_kg is formatted as given, so 5 and 5.0 must not share an entry
+    return _FMT % (mg_per_kg * w, mg_per_kg, w)
+
+
+def compute_dosage(weight_kg, mg_per_kg):
+    t = type(weight_kg)
+    w = weight_kg if t is float else float(weight_kg) if t is int else _safe_float(weight_kg)
+    if w is None:
+        return None
+    return _dosage_text(w, mg_per_kg)
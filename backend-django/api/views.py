@@ -1,15 +1,15 @@
 # backend-django/api/views.py
 import os
-import json
 import logging
+import math
 import re
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.base import File
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 from django.utils import timezone
 
 from rest_framework import viewsets, status, generics, permissions, filters
@@ -19,43 +19,29 @@ from rest_framework.decorators import action
 
 from rest_framework_simplejwt.views import TokenObtainPairView
 
-from .models import Cattle, Diagnosis, Media, CustomUser, DiagnosisAudit
+from .models import Cattle, Diagnosis, Media, CustomUser
 from .serializers import (
     CattleSerializer,
     DiagnosisSerializer,
     MediaSerializer,
     UserSerializer,
     DiagnosisReviewSerializer,  # <--- ensure review serializer is imported
+    save_uploaded_images,
 )
 from .permissions import IsOwnerOrVetAdmin, IsVetOrAdmin
-from .ml_client import call_inference, download_gradcam_image, SAMPLE_GRADCAM_PATH
-
-logger = logging.getLogger(__name__)
-
-# ---------------------------------------------------------------------------
-# Treatment map loader (memoized) — tolerate BOM using utf-8-sig
-# ---------------------------------------------------------------------------
-_TREATMENT_MAP: Optional[Dict[str, str]] = None
+from .ml_client import _is_http_url, call_inference, open_gradcam_image, SAMPLE_GRADCAM_PATH
+from .tasks import _record_audit, complete_diagnosis_task, record_audit
+from .utils_treatment import lookup as lookup_treatment
 
+# Optional: pyahocorasick for keyword matching (falls back to a compiled regex)
+try:
+    import ahocorasick  # type: ignore
+except Exception:
+    ahocorasick = None
 
-def load_treatment_map() -> Dict[str, str]:
-    global _TREATMENT_MAP
-    if _TREATMENT_MAP is not None:
-        return _TREATMENT_MAP
+logger = logging.getLogger(__name__)
 
-    base = getattr(settings, "BASE_DIR", None)
-    if not base:
-        base = Path(__file__).resolve().parents[2]
-    p = Path(base) / "metadata" / "treatment_map.json"
-    if p.exists():
-        try:
-            _TREATMENT_MAP = json.loads(p.read_text(encoding="utf-8-sig"))
-        except Exception as exc:
-            logger.exception("Failed to parse treatment_map.json at %s: %s", p, exc)
-            _TREATMENT_MAP = {}
-    else:
-        _TREATMENT_MAP = {}
-    return _TREATMENT_MAP
+_BASE_DIR = Path(getattr(settings, "BASE_DIR", None) or Path(__file__).resolve().parents[2])
 
 
 # ---------------------------------------------------------------------------
@@ -69,27 +55,26 @@ def compute_dosage(weight_kg: float, mg_per_kg: float) -> str:
         return ""
 
 
+_MG_PER_KG_PATTERNS = [
+    re.compile(p, re.I)
+    for p in (
+        r"([0-9]+(?:\.[0-9]+)?)\s*mg\s*/\s*kg",
+        r"mg[_\s/]*per[_\s]*kg[:=]?\s*([0-9]+(?:\.[0-9]+)?)",
+        r"mg_per_kg[:=]\s*([0-9]+(?:\.[0-9]+)?)",
+    )
+]
+
+
 def _extract_mg_per_kg(treatment_text: str) -> Optional[float]:
     if not treatment_text:
         return None
-    m = re.search(r"([0-9]+(?:\.[0-9]+)?)\s*mg\s*/\s*kg", treatment_text, flags=re.I)
-    if m:
-        try:
-            return float(m.group(1))
-        except Exception:
-            pass
-    m = re.search(r"mg[_\s/]*per[_\s]*kg[:=]?\s*([0-9]+(?:\.[0-9]+)?)", treatment_text, flags=re.I)
-    if m:
-        try:
-            return float(m.group(1))
-        except Exception:
-            pass
-    m = re.search(r"mg_per_kg[:=]\s*([0-9]+(?:\.[0-9]+)?)", treatment_text, flags=re.I)
-    if m:
-        try:
-            return float(m.group(1))
-        except Exception:
-            pass
+    for pat in _MG_PER_KG_PATTERNS:
+        m = pat.search(treatment_text)
+        if m:
+            try:
+                return float(m.group(1))
+            except Exception:
+                pass
     return None
 
 
@@ -106,64 +91,101 @@ DEFAULT_ML_TEMP = float(getattr(settings, "ML_TEMP", 1.0))
 BOOST_FACTOR = float(getattr(settings, "ML_KEYWORD_BOOST", 0.18))
 UNCERTAINTY_THRESHOLD = float(getattr(settings, "ML_UNCERTAINTY_THRESHOLD", 0.5))
 
-
-def _apply_temperature_scaling(probs: List[float], temp: float = 1.0) -> List[float]:
-    import numpy as _np
-
-    if temp is None or float(temp) == 1.0:
-        return probs
-    arr = _np.array(probs, dtype=_np.float64)
-    arr = _np.clip(arr, 1e-12, 1.0)
-    logits = _np.log(arr)
-    scaled = _np.exp(logits / float(temp))
-    scaled = scaled / float(_np.sum(scaled))
-    return scaled.tolist()
-
-
-def _boost_by_keywords(preds: List[Dict], symptom_text: str) -> List[Dict]:
+# search roots for DiagnosisViewSet._resolve_gradcam_candidates, in probe order
+# (constant for the process, so joined once here)
+_GRADCAM_ABS_ROOTS = (str(_BASE_DIR), str(_BASE_DIR / "ml-inference"))
+_GRADCAM_ABS_DIRS = tuple(str(_BASE_DIR / d) for d in ("ml-inference/gradcams", "gradcams", "backend-django/gradcams"))
+_GRADCAM_REL_DIRS = tuple(str(_BASE_DIR / d) for d in ("ml-inference", "gradcams", ""))
+
+
+# keyword -> diseases it votes for
+_KEYWORD_DISEASES: Dict[str, List[str]] = {}
+for _disease, _kws in DISEASE_KEYWORDS.items():
+    for _kw in _kws:
+        _KEYWORD_DISEASES.setdefault(_kw, []).append(_disease)
+
+# Single-pass matcher over the symptom text, built once. pyahocorasick reports every
+# (overlapping) keyword; the regex fallback finds the longest keyword at each position,
+# and every shorter keyword matching there is one of its prefixes.
+if ahocorasick is not None:
+    _KEYWORD_AUTOMATON = ahocorasick.Automaton()
+    for _kw in _KEYWORD_DISEASES:
+        _KEYWORD_AUTOMATON.add_word(_kw, _kw)
+    _KEYWORD_AUTOMATON.make_automaton()
+    _KEYWORD_RE = None
+else:
+    _KEYWORD_AUTOMATON = None
+    _KEYWORD_RE = re.compile(
+        "(?=(%s))" % "|".join(re.escape(k) for k in sorted(_KEYWORD_DISEASES, key=len, reverse=True))
+    )
+    _KEYWORD_PREFIXES = {k: [p for p in _KEYWORD_DISEASES if k.startswith(p)] for k in _KEYWORD_DISEASES}
+
+
+def _keyword_boosts(symptom_text: str) -> Dict[str, float]:
+    """{disease: additive boost}; each DISEASE_KEYWORDS entry found in symptom_text counts once."""
     txt = (symptom_text or "").lower()
-    boosts = {}
-    for disease, kws in DISEASE_KEYWORDS.items():
-        for kw in kws:
-            if kw in txt:
-                boosts[disease] = boosts.get(disease, 0.0) + BOOST_FACTOR
-    scores = []
-    for p in preds:
-        base = float(p.get("score", 0.0))
-        addition = boosts.get(p.get("disease"), 0.0)
-        scores.append((p.get("disease"), base + addition))
-    total = sum(s for _, s in scores) or 1.0
-    return [{"disease": d, "score": s / total} for d, s in scores]
-
-
-def postprocess_ml_response(resp: Dict[str, Any], symptom_text: str = "", cattle: Optional[Cattle] = None) -> Dict[str, Any]:
-    out = dict(resp)
-    raw_preds = resp.get("predictions", []) or []
-    diseases = [p.get("disease") for p in raw_preds]
-    scores = [float(p.get("score", 0.0)) for p in raw_preds]
+    if not txt:
+        return {}
+    if _KEYWORD_AUTOMATON is not None:
+        found = {kw for _, kw in _KEYWORD_AUTOMATON.iter(txt)}
+    else:
+        found = {p for m in _KEYWORD_RE.finditer(txt) for p in _KEYWORD_PREFIXES[m.group(1)]}
+    boosts: Dict[str, float] = {}
+    for kw in found:
+        for disease in _KEYWORD_DISEASES[kw]:
+            boosts[disease] = boosts.get(disease, 0.0) + BOOST_FACTOR
+    return boosts
 
-    # temperature scaling
-    scaled = _apply_temperature_scaling(scores, DEFAULT_ML_TEMP)
-    preds = [{"disease": d, "score": s} for d, s in zip(diseases, scaled)]
 
-    # keyword boost
-    preds_boosted = _boost_by_keywords(preds, symptom_text)
+def _rescore(raw_preds: List[Dict[str, Any]], symptom_text: str, cattle: Optional[Cattle]) -> List[Dict[str, Any]]:
+    boosts = _keyword_boosts(symptom_text)
 
     # optional cattle-based heuristics (small example)
+    lumpy_factor = 1.0
     if cattle:
         try:
             w = getattr(cattle, "weight_kg", None)
-            if w is not None:
-                w = float(w)
-                for p in preds_boosted:
-                    if p["disease"] == "lumpy" and w < 40:
-                        p["score"] *= 0.9
+            if w is not None and float(w) < 40:
+                lumpy_factor = 0.9
         except Exception:
             pass
 
-    # renormalize
-    total = sum(p["score"] for p in preds_boosted) or 1.0
-    preds_final = [{"disease": p["disease"], "score": float(p["score"] / total)} for p in preds_boosted]
+    # Temperature scaling, keyword boost and the cattle heuristic in one pass with a
+    # single final normalisation: the intermediate renormalisations only rescale the
+    # vector, except the temperature one, whose sum is needed because boosts are
+    # added to the scaled probabilities.
+    temp = DEFAULT_ML_TEMP
+    inv_t = None if temp is None or float(temp) == 1.0 else 1.0 / float(temp)
+    diseases = [p.get("disease") for p in raw_preds]
+    scaled = [float(p.get("score", 0.0)) for p in raw_preds]
+    if inv_t is not None:
+        scaled = [min(max(v, 1e-12), 1.0) ** inv_t for v in scaled]
+        norm = math.fsum(scaled) or 1.0
+    else:
+        norm = 1.0
+
+    values = []
+    for d, v in zip(diseases, scaled):
+        v = v / norm + boosts.get(d, 0.0)
+        if d == "lumpy":
+            v *= lumpy_factor
+        values.append(v)
+    total = math.fsum(values) or 1.0
+    return [{"disease": d, "score": v / total} for d, v in zip(diseases, values)]
+
+
+def postprocess_ml_response(resp: Dict[str, Any], symptom_text: str = "", cattle: Optional[Cattle] = None) -> Dict[str, Any]:
+    out = dict(resp)
+    raw_preds = resp.get("predictions", []) or []
+
+    # degenerate responses skip the keyword scan and the maths: with no classes there is
+    # nothing to rank, and a single positive score always normalises to 1.0
+    if not raw_preds:
+        preds_final = []
+    elif len(raw_preds) == 1 and 0.0 < float(raw_preds[0].get("score", 0.0)) < math.inf:
+        preds_final = [{"disease": raw_preds[0].get("disease"), "score": 1.0}]
+    else:
+        preds_final = _rescore(raw_preds, symptom_text, cattle)
 
     top = max(preds_final, key=lambda x: x["score"]) if preds_final else None
     confidence = top["score"] if top else 0.0
@@ -182,6 +204,171 @@ def postprocess_ml_response(resp: Dict[str, Any], symptom_text: str = "", cattle
     return out
 
 
+# ---------------------------------------------------------------------------
+# Diagnosis pipeline (shared by DiagnosisViewSet.create and the async task)
+# ---------------------------------------------------------------------------
+def _resolve_gradcam_candidates(gradcam_url: str) -> List[str]:
+    candidates: List[str] = []
+    if not gradcam_url:
+        return candidates
+
+    candidates.append(gradcam_url)
+    name = os.path.basename(gradcam_url)
+    if gradcam_url.startswith("/"):
+        rel = gradcam_url.lstrip("/")
+        candidates.extend(os.path.join(root, rel) for root in _GRADCAM_ABS_ROOTS)
+        candidates.extend(os.path.join(d, name) for d in _GRADCAM_ABS_DIRS)
+    else:
+        candidates.extend(os.path.join(d, name) for d in _GRADCAM_REL_DIRS)
+
+    if SAMPLE_GRADCAM_PATH:
+        candidates.append(str(SAMPLE_GRADCAM_PATH))
+
+    # the first entry is the raw value from the ML service (may be a URL or a
+    # server-side path) and is resolved in full by open_gradcam_image; the derived
+    # entries are plain local paths, so keep only those that exist, once per realpath
+    seen = {os.path.realpath(gradcam_url)} if not _is_http_url(gradcam_url) else set()
+    dedup = [gradcam_url]
+    for c in candidates[1:]:
+        if not c or not os.path.isfile(c):
+            continue
+        key = os.path.realpath(c)
+        if key not in seen:
+            dedup.append(c)
+            seen.add(key)
+    return dedup
+
+
+def complete_diagnosis(diag: Diagnosis, image_paths: Optional[List[str]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Run inference for a saved, pending diagnosis and store the outcome on it:
+    postprocessed predictions, severity, recommendation (+ treatment/dosage) and the
+    gradcam image. Must be called outside a transaction; only the final writes are atomic.
+    Returns (raw ML response, postprocessed response). If the inference call fails
+    the row is marked "failed" and the exception is re-raised.
+    """
+    try:
+        resp = call_inference(
+            symptom_text=diag.symptom_text or "",
+            image_paths=image_paths or None,
+            breed=(diag.cattle.breed if diag.cattle else None),
+            age=(diag.cattle.age_years if diag.cattle else None),
+            weight=(diag.cattle.weight_kg if diag.cattle else None),
+            case_id=str(diag.id)
+        )
+    except Exception as exc:
+        logger.exception("Inference call failed: %s", exc)
+        diag.status = "failed"
+        diag.recommendation = "Inference call failed. Please retry."
+        diag.save(update_fields=["status", "recommendation"])
+        raise
+
+    # Postprocess ML response
+    resp_processed = postprocess_ml_response(resp, symptom_text=diag.symptom_text, cattle=diag.cattle)
+
+    # Save processed fields
+    try:
+        diag.predictions = resp_processed.get("predictions_processed") or resp.get("predictions")
+        diag.top_prediction = resp_processed.get("top_processed") or resp.get("top")
+        diag.confidence = float(resp_processed.get("confidence_processed") or resp.get("confidence") or 0.0)
+    except Exception:
+        logger.exception("Failed to write predictions to Diagnosis model")
+
+    # severity
+    severity = resp.get("severity")
+    if not severity:
+        c = diag.confidence or 0.0
+        if c > 0.8:
+            severity = "high"
+        elif c > 0.5:
+            severity = "medium"
+        else:
+            severity = "low"
+    diag.severity = severity
+
+    # base recommendation
+    rec = resp.get("explanation_text") or resp.get("recommendation") or ""
+    if not rec:
+        top = diag.top_prediction or {}
+        if top:
+            rec = f"Top prediction: {top.get('disease')} (score {top.get('score')}). Consult a veterinarian for confirmation."
+
+    # append treatment from treatment_map.json
+    try:
+        top = resp_processed.get("top_processed") or resp.get("top") or {}
+        disease_label = (top.get("disease") if isinstance(top, dict) else None)
+        if disease_label:
+            breed = getattr(diag.cattle, "breed", None) if diag.cattle else None
+            treatment_text = lookup_treatment(disease_label, breed or None)
+            if treatment_text:
+                rec = (rec or "") + "\n\nSuggested treatment:\n" + treatment_text
+                mg_per_kg = _extract_mg_per_kg(treatment_text)
+                weight_val = getattr(diag.cattle, "weight_kg", None) if diag.cattle else None
+                if mg_per_kg and weight_val:
+                    dosage = compute_dosage(weight_val, mg_per_kg)
+                    if dosage:
+                        rec += f"\n\nDosage guidance (auto-computed): {dosage}"
+    except Exception:
+        logger.exception("Failed to append treatment_map info")
+
+    # append recommendation_suffix from processed (e.g. low-confidence note)
+    rec = (rec or "") + (resp_processed.get("recommendation_suffix") or "")
+
+    diag.recommendation = rec
+
+    # handle gradcam_url (try multiple candidate paths/URLs)
+    gradcam_url = resp.get("gradcam_url") or resp_processed.get("gradcam_url")
+    saved_gradcam = False
+    gradcam_media: Optional[Media] = None
+    if gradcam_url:
+        try:
+            candidates = _resolve_gradcam_candidates(str(gradcam_url))
+            for cand in candidates:
+                try:
+                    fh = open_gradcam_image(cand)
+                    if fh is not None:
+                        fname = f"gradcam_{diag.id}_{os.path.basename(cand)}"
+                        media = Media(gradcam_url=cand)
+                        # stream the handle into storage instead of buffering it;
+                        # the row itself is inserted in the final transaction below
+                        with fh:
+                            media.file.save(fname, File(fh), save=False)
+                        gradcam_media = media
+                        saved_gradcam = True
+                        logger.info("Saved gradcam from candidate: %s", cand)
+                        break
+                except Exception:
+                    logger.debug("Candidate failed for gradcam: %s", cand, exc_info=True)
+        except Exception:
+            logger.exception("Failed to download/save gradcam")
+
+    # dev fallback: save sample gradcam if none saved
+    if not saved_gradcam:
+        try:
+            if SAMPLE_GRADCAM_PATH and os.path.exists(SAMPLE_GRADCAM_PATH):
+                fh = open_gradcam_image(str(SAMPLE_GRADCAM_PATH))
+                if fh is not None:
+                    fname = f"gradcam_{diag.id}_{os.path.basename(SAMPLE_GRADCAM_PATH)}"
+                    media = Media(gradcam_url=SAMPLE_GRADCAM_PATH)
+                    with fh:
+                        media.file.save(fname, File(fh), save=False)
+                    gradcam_media = media
+                    saved_gradcam = True
+        except Exception:
+            logger.exception("Failed to save sample gradcam fallback")
+
+    # persist the results in one short transaction
+    with transaction.atomic():
+        if gradcam_media is not None:
+            gradcam_media.save()
+            diag.images.add(gradcam_media)
+        diag.status = "completed"
+        diag.save(update_fields=[
+            "predictions", "top_prediction", "confidence", "severity", "recommendation", "status",
+        ])
+    return resp, resp_processed
+
+
 # ---------------------------------------------------------------------------
 # Auth endpoints (unchanged)
 # ---------------------------------------------------------------------------
@@ -231,11 +418,58 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
     parser_classes = (MultiPartParser, FormParser, JSONParser)
     filter_backends = (filters.SearchFilter,)
     search_fields = ("top_prediction", "severity", "status")
-    queryset = Diagnosis.objects.select_related("cattle", "submitted_by").prefetch_related("images").all()
+    # everything DiagnosisSerializer nests, fetched up front (no per-row queries).
+    # Users (submitted_by / reviewed_by / cattle.owner) are rendered as bare pks,
+    # which DRF reads from the *_id columns, so their rows are never joined.
+    queryset = Diagnosis.objects.select_related("cattle").prefetch_related(
+        Prefetch("images", queryset=Media.objects.only("id", "file", "thumbnail", "gradcam_url", "uploaded_at"))
+    )
 
 
+    # narrow columns for ?compact=1 list pages (no predictions JSON / recommendation text)
+    LIST_SUMMARY_FIELDS = (
+        "id", "cattle", "submitted_by", "top_prediction", "confidence",
+        "severity", "status", "review_status", "created_at",
+    )
+
+    def _requested_fields(self) -> Optional[List[str]]:
+        """
+        ?fields=id,status,... on GET requests, or LIST_SUMMARY_FIELDS for ?compact=1
+        on the list; None means the full representation (what the frontend reads).
+        """
+        if self.request.method != "GET":
+            return None
+        raw = self.request.query_params.get("fields")
+        if not raw:
+            if self.action == "list" and self.request.query_params.get("compact") in ("1", "true"):
+                return list(self.LIST_SUMMARY_FIELDS)
+            return None
+        return [f.strip() for f in raw.split(",") if f.strip()]
+
+    @staticmethod
+    def _only_columns(fields: List[str]) -> List[str]:
+        """Columns to load for a ?fields= subset (plus what IsOwnerOrVetAdmin reads)."""
+        concrete = {f.name for f in Diagnosis._meta.concrete_fields}
+        cols = {"id", "cattle", "submitted_by", "cattle__id", "cattle__owner"}
+        cols.update(f for f in fields if f in concrete)
+        if "cattle" in fields:
+            cols.update(f"cattle__{f}" for f in CattleSerializer.Meta.fields)
+        return sorted(cols)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self._requested_fields()
+        if fields is not None:
+            kwargs.setdefault("fields", fields)
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
         qs = super().get_queryset()
+        fields = self._requested_fields()
+        if fields is not None and "images" not in fields:
+            # images are not rendered, so skip their prefetch query
+            qs = qs.prefetch_related(None)
+        if fields is not None:
+            qs = qs.only(*self._only_columns(fields))
         user = self.request.user
         cattle_id = self.request.query_params.get("cattle_id")
         if cattle_id:
@@ -244,39 +478,6 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             return qs
         return qs.filter(Q(submitted_by=user) | Q(cattle__owner=user))
 
-    def _resolve_gradcam_candidates(self, gradcam_url: str) -> List[str]:
-        candidates: List[str] = []
-        if not gradcam_url:
-            return candidates
-
-        candidates.append(gradcam_url)
-        base = getattr(settings, "BASE_DIR", None)
-        if not base:
-            base = Path(__file__).resolve().parents[2]
-
-        p = Path(gradcam_url)
-        if gradcam_url.startswith("/"):
-            candidates.append(str(Path(base) / gradcam_url.lstrip("/")))
-            candidates.append(str(Path(base) / "ml-inference" / gradcam_url.lstrip("/")))
-            candidates.append(str(Path(base) / "ml-inference" / "gradcams" / p.name))
-            candidates.append(str(Path(base) / "gradcams" / p.name))
-            candidates.append(str(Path(base) / "backend-django" / "gradcams" / p.name))
-        else:
-            candidates.append(str(Path(base) / "ml-inference" / p.name))
-            candidates.append(str(Path(base) / "gradcams" / p.name))
-            candidates.append(str(Path(base) / p.name))
-
-        if SAMPLE_GRADCAM_PATH:
-            candidates.append(str(SAMPLE_GRADCAM_PATH))
-
-        seen = set()
-        dedup = []
-        for c in candidates:
-            if c and c not in seen:
-                dedup.append(c)
-                seen.add(c)
-        return dedup
-
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
@@ -294,6 +495,11 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
         else:
             uploaded_files = list(request.FILES.values())
 
+        async_diagnosis = getattr(settings, "ASYNC_DIAGNOSIS", False) and complete_diagnosis_task is not None
+
+        # 1) rows only: the transaction is closed before any network I/O, so no locks or
+        #    connection are held while inference runs. The row stays "pending" until step 3,
+        #    so a crash in between leaves it recoverable.
         with transaction.atomic():
             diag = Diagnosis.objects.create(
                 cattle=cattle,
@@ -302,137 +508,34 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
                 status="pending"
             )
 
+            medias = save_uploaded_images(diag, uploaded_files)
+
             image_paths: List[str] = []
-            for f in uploaded_files:
-                media = Media.objects.create(file=f)
-                diag.images.add(media)
+            for media in medias:
                 try:
                     if hasattr(media.file, "path") and media.file.path:
                         image_paths.append(media.file.path)
                 except Exception:
                     logger.warning("Media file has no .path (maybe remote storage): %s", getattr(media.file, "name", None))
 
-            # call inference
-            try:
-                resp = call_inference(
-                    symptom_text=diag.symptom_text or "",
-                    image_paths=image_paths or None,
-                    breed=(diag.cattle.breed if diag.cattle else None),
-                    age=(diag.cattle.age_years if diag.cattle else None),
-                    weight=(diag.cattle.weight_kg if diag.cattle else None),
-                    case_id=str(diag.id)
-                )
-            except Exception as exc:
-                logger.exception("Inference call failed: %s", exc)
-                diag.status = "failed"
-                diag.recommendation = "Inference call failed. Please retry."
-                diag.save()
-                out = DiagnosisSerializer(diag, context={"request": request})
-                return Response(out.data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-
-            # Postprocess ML response
-            resp_processed = postprocess_ml_response(resp, symptom_text=diag.symptom_text, cattle=diag.cattle)
-
-            # Save processed fields
-            try:
-                diag.predictions = resp_processed.get("predictions_processed") or resp.get("predictions")
-                diag.top_prediction = resp_processed.get("top_processed") or resp.get("top")
-                diag.confidence = float(resp_processed.get("confidence_processed") or resp.get("confidence") or 0.0)
-            except Exception:
-                logger.exception("Failed to write predictions to Diagnosis model")
-
-            # severity
-            severity = resp.get("severity")
-            if not severity:
-                c = diag.confidence or 0.0
-                if c > 0.8:
-                    severity = "high"
-                elif c > 0.5:
-                    severity = "medium"
-                else:
-                    severity = "low"
-            diag.severity = severity
-
-            # base recommendation
-            rec = resp.get("explanation_text") or resp.get("recommendation") or ""
-            if not rec:
-                top = diag.top_prediction or {}
-                if top:
-                    rec = f"Top prediction: {top.get('disease')} (score {top.get('score')}). Consult a veterinarian for confirmation."
-
-            # append treatment from treatment_map.json
-            try:
-                top = resp_processed.get("top_processed") or resp.get("top") or {}
-                disease_label = (top.get("disease") if isinstance(top, dict) else None)
-                if disease_label:
-                    treatment_map = load_treatment_map()
-                    treatment_text = treatment_map.get(disease_label)
-                    if treatment_text:
-                        rec = (rec or "") + "\n\nSuggested treatment:\n" + treatment_text
-                        mg_per_kg = _extract_mg_per_kg(treatment_text)
-                        weight_val = getattr(diag.cattle, "weight_kg", None) if diag.cattle else None
-                        if mg_per_kg and weight_val:
-                            dosage = compute_dosage(weight_val, mg_per_kg)
-                            if dosage:
-                                rec += f"\n\nDosage guidance (auto-computed): {dosage}"
-            except Exception:
-                logger.exception("Failed to append treatment_map info")
-
-            # append recommendation_suffix from processed (e.g. low-confidence note)
-            rec = (rec or "") + (resp_processed.get("recommendation_suffix") or "")
+            if async_diagnosis:
+                diag_id = diag.id
+                transaction.on_commit(lambda: complete_diagnosis_task.delay(diag_id))
 
-            diag.recommendation = rec
+        if async_diagnosis:
+            # a worker runs the pipeline; the client polls GET /api/diagnosis/{id}/
+            out = DiagnosisSerializer(diag, context={"request": request})
+            return Response(out.data, status=status.HTTP_202_ACCEPTED)
 
-            # handle gradcam_url (try multiple candidate paths/URLs)
-            gradcam_url = resp.get("gradcam_url") or resp_processed.get("gradcam_url")
-            saved_gradcam = False
-            if gradcam_url:
-                try:
-                    candidates = self._resolve_gradcam_candidates(str(gradcam_url))
-                    for cand in candidates:
-                        try:
-                            content = download_gradcam_image(cand)
-                            if content:
-                                fname = f"gradcam_{diag.id}_{os.path.basename(cand)}"
-                                media = Media()
-                                media.file.save(fname, ContentFile(content), save=True)
-                                try:
-                                    media.gradcam_url = cand
-                                    media.save()
-                                except Exception:
-                                    media.save()
-                                diag.images.add(media)
-                                saved_gradcam = True
-                                logger.info("Saved gradcam from candidate: %s", cand)
-                                break
-                        except Exception:
-                            logger.debug("Candidate failed for gradcam: %s", cand, exc_info=True)
-                except Exception:
-                    logger.exception("Failed to download/save gradcam")
-
-            # dev fallback: save sample gradcam if none saved
-            if not saved_gradcam:
-                try:
-                    if SAMPLE_GRADCAM_PATH and os.path.exists(SAMPLE_GRADCAM_PATH):
-                        content = download_gradcam_image(str(SAMPLE_GRADCAM_PATH))
-                        if content:
-                            fname = f"gradcam_{diag.id}_{os.path.basename(SAMPLE_GRADCAM_PATH)}"
-                            media = Media()
-                            media.file.save(fname, ContentFile(content), save=True)
-                            try:
-                                media.gradcam_url = SAMPLE_GRADCAM_PATH
-                                media.save()
-                            except Exception:
-                                media.save()
-                            diag.images.add(media)
-                            saved_gradcam = True
-                except Exception:
-                    logger.exception("Failed to save sample gradcam fallback")
-
-            diag.status = "completed"
-            diag.save()
+        # 2) inference + postprocessing + gradcam fetch, outside any transaction
+        try:
+            resp, resp_processed = complete_diagnosis(diag, image_paths)
+        except Exception:
+            out = DiagnosisSerializer(diag, context={"request": request})
+            return Response(out.data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-        out = DiagnosisSerializer(Diagnosis.objects.get(pk=diag.pk), context={"request": request}).data
+        # diag is current in memory (cattle came from validation); no need to re-SELECT it
+        out = DiagnosisSerializer(diag, context={"request": request}).data
         out["_ml"] = {
             "predictions_raw": resp.get("predictions"),
             "predictions_processed": resp_processed.get("predictions_processed"),
@@ -460,7 +563,7 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
 
         # Snapshot before
         before = {
-            "predictions": diag.predictions,
+            "predictions": diag.predictions_full,
             "top_prediction": diag.top_prediction,
             "confidence": diag.confidence,
             "recommendation": diag.recommendation,
@@ -475,13 +578,14 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
         diag.reviewed_by = request.user
         diag.reviewed_at = timezone.now()
 
+        # only the columns touched here are written (predictions can be large)
+        update_fields = ["review_status", "review_notes", "reviewed_by", "reviewed_at", "status"]
+
         # Optional overrides from vet
-        if "predictions" in data and data["predictions"] is not None:
-            diag.predictions = data["predictions"]
-        if "top_prediction" in data and data["top_prediction"] is not None:
-            diag.top_prediction = data["top_prediction"]
-        if "recommendation" in data and data["recommendation"] is not None:
-            diag.recommendation = data["recommendation"]
+        for name in ("predictions", "top_prediction", "recommendation"):
+            if data.get(name) is not None:
+                setattr(diag, name, data[name])
+                update_fields.append(name)
 
         # decide status mapping
         if diag.review_status == "approved":
@@ -492,26 +596,31 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             # edited
             diag.status = "under_treatment" if diag.severity == "medium" else diag.status
 
-        diag.save()
-
-        # Create audit record
+        diag.save(update_fields=update_fields)
+
+        # Create audit record: queued to a worker when Celery is configured (the snapshots
+        # can be large), otherwise written inline; either way only once the save committed
+        audit_args = (
+            diag.pk,
+            request.user.pk,
+            diag.review_status,
+            before,
+            {
+                "predictions": diag.predictions_full,
+                "top_prediction": diag.top_prediction,
+                "confidence": diag.confidence,
+                "recommendation": diag.recommendation,
+                "status": diag.status,
+                "review_status": diag.review_status,
+                "review_notes": diag.review_notes,
+            },
+            diag.review_notes or "",
+        )
         try:
-            DiagnosisAudit.objects.create(
-                diagnosis=diag,
-                actor=request.user,
-                action=diag.review_status,
-                before=before,
-                after={
-                    "predictions": diag.predictions,
-                    "top_prediction": diag.top_prediction,
-                    "confidence": diag.confidence,
-                    "recommendation": diag.recommendation,
-                    "status": diag.status,
-                    "review_status": diag.review_status,
-                    "review_notes": diag.review_notes,
-                },
-                notes=diag.review_notes or "",
-            )
+            if getattr(settings, "AUDIT_ASYNC", False) and record_audit is not None:
+                transaction.on_commit(lambda: record_audit.delay(*audit_args))
+            else:
+                transaction.on_commit(lambda: _record_audit(*audit_args))
         except Exception:
             logger.exception("Failed to create DiagnosisAudit for review")
 
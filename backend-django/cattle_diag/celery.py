@@ -0,0 +1,16 @@
+# cattle_diag/celery.py
+import os
+
+# Optional: celery is only needed when INFERENCE_ASYNC is enabled
+try:
+    from celery import Celery  # type: ignore
+except Exception:
+    Celery = None
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cattle_diag.settings")
+
+app = None
+if Celery is not None:
+    app = Celery("cattle_diag")
+    app.config_from_object("django.conf:settings", namespace="CELERY")
+    app.autodiscover_tasks()
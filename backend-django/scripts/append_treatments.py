@@ -1,5 +1,7 @@
 # backend-django/scripts/append_treatments.py
+import ast
 import json
+import re
 from pathlib import Path
 from api.models import Diagnosis
 from django.conf import settings
@@ -11,10 +13,11 @@ def load_treatment_map():
         return json.loads(p.read_text(encoding="utf8"))
     return {}
 
+MG_PER_KG_RE = re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*mg\s*/\s*kg", re.I)
+
 def extract_mg_per_kg(text):
-    import re
     if not text: return None
-    m = re.search(r"([0-9]+(?:\.[0-9]+)?)\s*mg\s*/\s*kg", text, flags=re.I)
+    m = MG_PER_KG_RE.search(text)
     if m: return float(m.group(1))
     return None
 
@@ -25,20 +28,33 @@ def compute_dosage(weight_kg, mg_per_kg):
     except Exception:
         return ""
 
+BATCH_SIZE = 500
+
 tmap = load_treatment_map()
 updated = 0
-for d in Diagnosis.objects.all():
+pending = []
+# stream rows in chunks (bounded memory) and write recommendations back in batches
+qs = (
+    Diagnosis.objects.select_related("cattle")
+    .only("id", "top_prediction", "recommendation", "cattle__id", "cattle__weight_kg")
+    .iterator(chunk_size=1000)
+)
+for d in qs:
     top = d.top_prediction or {}
     disease = None
     if isinstance(top, dict):
         disease = top.get("disease")
     elif isinstance(top, str):
+        # legacy string rows (see migration 0006); json first, literal_eval for repr()-style dicts
         try:
-            import ast
-            td = ast.literal_eval(top)
+            td = json.loads(top)
+        except ValueError:
+            try:
+                td = ast.literal_eval(top)
+            except Exception:
+                td = None
+        if isinstance(td, dict):
             disease = td.get("disease")
-        except Exception:
-            pass
     if not disease:
         continue
     treatment_text = tmap.get(disease)
@@ -53,7 +69,13 @@ for d in Diagnosis.objects.all():
             if dosage:
                 rec += f"\n\nDosage guidance (auto-computed): {dosage}"
         d.recommendation = rec
-        d.save(update_fields=["recommendation"])
+        pending.append(d)
         updated += 1
+        if len(pending) >= BATCH_SIZE:
+            Diagnosis.objects.bulk_update(pending, ["recommendation"], batch_size=BATCH_SIZE)
+            pending.clear()
+
+if pending:
+    Diagnosis.objects.bulk_update(pending, ["recommendation"], batch_size=BATCH_SIZE)
 
 print("Updated recommendations for", updated, "diagnoses")
@@ -2,8 +2,12 @@
 """
 Convert existing api_diagnosis.top_prediction values (Python repr strings)
 into valid JSON text so SQLite's JSON_VALID check passes during migration.
+All rows are written with one executemany in a single transaction; pass -v to
+log every converted row (only skips and the summary are shown by default).
 """
 
+import argparse
+import logging
 import os
 import django
 import ast
@@ -12,48 +16,92 @@ import re
 from django.conf import settings
 import sqlite3
 
+# Optional: orjson for faster JSON parse/dump (falls back to stdlib json)
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cattle_diag.settings")  # adjust if your settings module differs
 django.setup()
 
+# compiled once; used for every row that literal_eval cannot read
+_SQ_RE = re.compile(r"(?<!\\)'")
+_PY_LIT_RE = re.compile(r"\b(None|True|False)\b")
+_PY_LIT_MAP = {"None": "null", "True": "true", "False": "false"}
+
+if orjson is not None:
+    _loads = orjson.loads
+
+    def _dumps(obj):
+        # literal_eval can yield int keys; stringify them like json.dumps does
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+else:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
 DB_PATH = settings.DATABASES["default"]["NAME"]
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-v", "--verbose", action="store_true", help="log every converted row")
+args = parser.parse_args()
+logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format="%(message)s")
+log = logging.getLogger("convert_top_to_json_db")
 print("Using DB:", DB_PATH)
 
 conn = sqlite3.connect(DB_PATH)
 cur = conn.cursor()
+# WAL + NORMAL: the batch below commits once instead of fsyncing a rollback journal per row
+cur.execute("PRAGMA journal_mode=WAL")
+cur.execute("PRAGMA synchronous=NORMAL")
 
-rows = cur.execute("SELECT id, top_prediction FROM api_diagnosis").fetchall()
-print(f"Found {len(rows)} rows in api_diagnosis")
+# NULL / non-text rows are never candidates, so leave them in the database
+rows = cur.execute(
+    "SELECT id, top_prediction FROM api_diagnosis "
+    "WHERE top_prediction IS NOT NULL AND typeof(top_prediction) = 'text'"
+).fetchall()
+print(f"Found {len(rows)} non-NULL text rows in api_diagnosis")
 
 updated = 0
 skipped = 0
+updates = []
 
 for row in rows:
     pk, tp = row
-    if tp is None:
+    # safety net; the WHERE clause already filters these out
+    if not isinstance(tp, str):
         skipped += 1
         continue
-    if not isinstance(tp, str):
+
+    # cheap checks first: anything else cannot parse to a dict/list
+    if not tp.strip().startswith(("{", "[")):
+        log.warning("SKIP id=%s: not a dict/list literal -> %r", pk, tp)
         skipped += 1
         continue
 
-    parsed = None
-    # 1) try ast.literal_eval (handles Python dict repr)
+    # 0) already valid JSON (re-dumped below in compact form): no AST parse needed
     try:
-        parsed = ast.literal_eval(tp)
-    except Exception:
+        parsed = _loads(tp)
+    except ValueError:
         parsed = None
 
+    # 1) try ast.literal_eval (handles Python dict repr)
+    if parsed is None:
+        try:
+            parsed = ast.literal_eval(tp)
+        except Exception:
+            parsed = None
+
     # 2) fallback: convert single quotes -> double quotes, attempt json.loads
     if parsed is None:
         try:
             s = tp.strip()
             # best-effort replace unescaped single quotes with double quotes
-            s2 = re.sub(r"(?<!\\)'", '"', s)
-            # normalize Python literals to JSON
-            s2 = re.sub(r"\bNone\b", "null", s2)
-            s2 = re.sub(r"\bTrue\b", "true", s2)
-            s2 = re.sub(r"\bFalse\b", "false", s2)
-            parsed = json.loads(s2)
+            s2 = _SQ_RE.sub('"', s)
+            # normalize Python literals to JSON (one pass for all three)
+            s2 = _PY_LIT_RE.sub(lambda m: _PY_LIT_MAP[m.group(1)], s2)
+            parsed = _loads(s2)
         except Exception:
             parsed = None
 
@@ -61,26 +109,29 @@ for row in rows:
     if parsed is None:
         try:
             s3 = tp.replace("'", '"')
-            parsed = json.loads(s3)
+            parsed = _loads(s3)
         except Exception:
             parsed = None
 
     if parsed is None:
-        print(f"SKIP id={pk}: could not parse -> {tp!r}")
+        log.warning("SKIP id=%s: could not parse -> %r", pk, tp)
         skipped += 1
         continue
 
     # ensure parsed is dict/list
     if not isinstance(parsed, (dict, list)):
-        print(f"SKIP id={pk}: parsed to {type(parsed).__name__}, not dict/list")
+        log.warning("SKIP id=%s: parsed to %s, not dict/list", pk, type(parsed).__name__)
         skipped += 1
         continue
 
-    json_text = json.dumps(parsed, separators=(",", ":"), ensure_ascii=False)
-    cur.execute("UPDATE api_diagnosis SET top_prediction = ? WHERE id = ?", (json_text, pk))
+    json_text = _dumps(parsed)
+    updates.append((json_text, pk))
     updated += 1
-    print(f"UPDATED id={pk} -> {json_text}")
+    log.debug("UPDATED id=%s -> %s", pk, json_text)
 
-conn.commit()
+if updates:
+    cur.execute("BEGIN")
+    cur.executemany("UPDATE api_diagnosis SET top_prediction = ? WHERE id = ?", updates)
+    conn.commit()
 conn.close()
 print(f"Done. updated={updated}, skipped={skipped}")
@@ -5,19 +5,44 @@ Fix Diagnosis.top_prediction values that were stored as Python repr strings
 Python dicts (JSON-like) so your model uses JSONField properly.
 
 This script is idempotent and will skip rows that are already dict-like.
-It prints summary lines as it updates.
+It prints a summary at the end; pass -v to also log every converted row.
 """
 
+import argparse
 import ast
 import json
+import logging
 import re
 from django.db import transaction
 from api.models import Diagnosis
 
+# Optional: orjson for the already-JSON fast path (falls back to stdlib json)
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+log = logging.getLogger(__name__)
+
+# unescaped single quote (compiled once, used per row)
+_SQ_RE = re.compile(r"(?<!\\)'")
+
 def try_parse_string_top(tp_str):
     """Try several safe ways to convert a string to a Python dict."""
     if not isinstance(tp_str, str):
         return None
+    # cheap checks first: only an object literal can yield a dict, and rows that are
+    # already valid JSON need no AST parse at all
+    if not tp_str.strip().startswith("{"):
+        return None
+    try:
+        val = _loads(tp_str)
+        if isinstance(val, dict):
+            return val
+    except ValueError:
+        pass
     # 1) try ast.literal_eval (safe)
     try:
         val = ast.literal_eval(tp_str)
@@ -30,7 +55,7 @@ def try_parse_string_top(tp_str):
         s = tp_str.strip()
         # Replace unescaped single quotes with double quotes (best-effort)
         # This is conservative: it will not attempt to fix complex cases.
-        s2 = re.sub(r"(?<!\\)'", '"', s)
+        s2 = _SQ_RE.sub('"', s)
         val = json.loads(s2)
         if isinstance(val, dict):
             return val
@@ -51,47 +76,70 @@ def try_parse_string_top(tp_str):
     return None
 
 
-def main():
+BATCH_SIZE = 500
+
+
+def _flush(batch):
+    """Write one batch of parsed rows; returns how many were saved."""
+    try:
+        with transaction.atomic():
+            Diagnosis.objects.bulk_update(batch, ["top_prediction"], batch_size=BATCH_SIZE)
+    except Exception as e:
+        log.error("ERROR saving ids %s..%s (%d rows): %s", batch[0].id, batch[-1].id, len(batch), e)
+        return 0
+    return len(batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert repr-string top_prediction values to dicts.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every converted row")
+    # tolerate the host command's own arguments (e.g. when piped into manage.py shell)
+    args, _ = parser.parse_known_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format="%(message)s")
+
     total = 0
     updated = 0
     skipped = 0
     errors = 0
 
-    qs = Diagnosis.objects.all()
-    total = qs.count()
-    print(f"Found {total} Diagnosis rows. Processing...")
+    # only the column being fixed is loaded and NULL rows never leave the database; rows
+    # are counted while streaming rather than with a separate COUNT(*), and parsed rows
+    # are written back in batches
+    qs = Diagnosis.objects.only("id", "top_prediction").exclude(top_prediction__isnull=True)
+    print("Processing Diagnosis rows...")
 
-    for d in qs.iterator():
+    pending = []
+    for d in qs.iterator(chunk_size=2000):
+        total += 1
         tp = d.top_prediction
-        # if it's already a dict (or None), skip
-        if tp is None:
-            skipped += 1
-            continue
-        # In some setups top_prediction is already a dict-like (if using JSONField), test:
+        # top_prediction is a JSONField, so already-converted rows come back as dicts
+        # (and a JSON null as None); only string values need fixing
         if not isinstance(tp, str):
             skipped += 1
             continue
 
         parsed = try_parse_string_top(tp)
         if parsed is None:
-            print(f"SKIP id={d.id}: could not parse top_prediction string: {tp!r}")
+            log.warning("SKIP id=%s: could not parse top_prediction string: %r", d.id, tp)
             errors += 1
             continue
 
-        try:
-            # Use a transaction per-row to be safe
-            with transaction.atomic():
-                d.top_prediction = parsed
-                # If your field is JSON/text, this will write appropriate structure.
-                d.save(update_fields=["top_prediction"])
-            updated += 1
-            print(f"UPDATED id={d.id} -> {parsed}")
-        except Exception as e:
-            print(f"ERROR id={d.id} saving parsed top_prediction: {e}")
-            errors += 1
+        d.top_prediction = parsed
+        pending.append(d)
+        log.debug("UPDATED id=%s -> %s", d.id, parsed)
+        if len(pending) >= BATCH_SIZE:
+            saved = _flush(pending)
+            updated += saved
+            errors += len(pending) - saved
+            pending.clear()
+
+    if pending:
+        saved = _flush(pending)
+        updated += saved
+        errors += len(pending) - saved
 
     print("Done.")
-    print(f"Total: {total}, Updated: {updated}, Skipped (already ok / None): {skipped}, Errors/Unparsed: {errors}")
+    print(f"Scanned (non-NULL): {total}, Updated: {updated}, Skipped (already ok): {skipped}, Errors/Unparsed: {errors}")
 
 
 if __name__ == "__main__":
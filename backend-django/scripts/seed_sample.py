@@ -1,15 +1,19 @@
 # backend-django/scripts/seed_sample.py
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # make sure you're running from backend-django/ - otherwise adjust path
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend_django.settings")  # <--- change if your settings module path differs
 import django
 django.setup()
 
-from api.models import Cattle, Diagnosis, CustomUser
+from api.models import Cattle, Diagnosis, CustomUser, _pack_preds
 from api.ml_client import call_inference
 
+# must not exceed the ml_client session pool size (pool_maxsize=32)
+INFERENCE_WORKERS = 8
+
 def get_superuser():
     # prefer a superuser if present
     su = CustomUser.objects.filter(is_superuser=True).first()
@@ -20,22 +24,42 @@ def get_superuser():
     return u
 
 def create_cattle(owner):
-    created = []
-    for i in range(1, 11):
-        tag = f"C-TST-{100+i}"
-        name = f"TestCow{i}"
-        c, _ = Cattle.objects.get_or_create(
-            tag_number=tag,
-            defaults={
-                "name": name,
-                "breed": "mixed",
-                "age_years": 2 + (i % 6),
-                "weight_kg": 200 + i * 5,
-                "owner": owner
-            }
-        )
-        created.append(c)
-    return created
+    tags = [f"C-TST-{100+i}" for i in range(1, 11)]
+    existing = set(Cattle.objects.filter(tag_number__in=tags).values_list("tag_number", flat=True))
+    Cattle.objects.bulk_create(
+        [
+            Cattle(
+                tag_number=tag,
+                name=f"TestCow{i}",
+                breed="mixed",
+                age_years=2 + (i % 6),
+                weight_kg=200 + i * 5,
+                owner=owner,
+            )
+            for i, tag in enumerate(tags, start=1)
+            if tag not in existing
+        ],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
+    # re-fetch so every row carries its pk (ignore_conflicts does not set them)
+    by_tag = {c.tag_number: c for c in Cattle.objects.filter(tag_number__in=tags)}
+    return [by_tag[t] for t in tags if t in by_tag]
+
+def _infer(d):
+    # call inference; if it fails, use a mock
+    try:
+        # rows have no pk yet, so the cattle tag is used as the case id
+        return call_inference(symptom_text=d.symptom_text, image_paths=None, case_id=d.cattle.tag_number)
+    except Exception as e:
+        print(f"call_inference failed for {d.cattle.tag_number} (using mock): {e}")
+        return {
+            "predictions": [{"disease": "healthy", "score": 0.5}],
+            "top": {"disease": "healthy", "score": 0.5},
+            "confidence": 0.5,
+            "explanation_text": "mock result - inference not available",
+            "model_version": "mock"
+        }
 
 def seed():
     owner = get_superuser()
@@ -47,35 +71,29 @@ def seed():
     cattle = create_cattle(owner)
     print(f"Created/confirmed {len(cattle)} cattle. Total Cattle in DB:", Cattle.objects.count())
 
-    # create diagnoses for the created cattle
-    for i, c in enumerate(cattle, start=1):
-        d = Diagnosis.objects.create(
-            cattle=c,
-            submitted_by=owner,
-            symptom_text=f"auto-seed symptom {i}",
-            status="pending"
-        )
-        # call inference; if it fails, use a mock
-        try:
-            resp = call_inference(symptom_text=d.symptom_text, image_paths=None, case_id=str(d.id))
-        except Exception as e:
-            print(f"call_inference failed for diag {d.id} (using mock): {e}")
-            resp = {
-                "predictions": [{"disease": "healthy", "score": 0.5}],
-                "top": {"disease": "healthy", "score": 0.5},
-                "confidence": 0.5,
-                "explanation_text": "mock result - inference not available",
-                "model_version": "mock"
-            }
+    # build diagnoses for the created cattle in memory; they are inserted in one batch below
+    diagnoses = [
+        Diagnosis(cattle=c, submitted_by=owner, symptom_text=f"auto-seed symptom {i}", status="pending")
+        for i, c in enumerate(cattle, start=1)
+    ]
+
+    # inference calls are I/O bound: run them concurrently over the pooled session
+    with ThreadPoolExecutor(max_workers=INFERENCE_WORKERS) as ex:
+        futs = {ex.submit(_infer, d): d for d in diagnoses}
+        for fut in as_completed(futs):
+            d = futs[fut]
+            resp = fut.result()
+            # bulk_create bypasses Diagnosis.save(), so pack here
+            d.predictions = _pack_preds(resp.get("predictions"))
+            d.top_prediction = resp.get("top")
+            d.confidence = float(resp.get("confidence") or resp.get("top", {}).get("score", 0.0) or 0.0)
+            d.severity = resp.get("severity") or ("high" if d.confidence > 0.8 else "medium" if d.confidence > 0.5 else "low")
+            d.recommendation = resp.get("explanation_text") or resp.get("recommendation", "")
+            d.status = "completed"
 
-        d.predictions = resp.get("predictions")
-        d.top_prediction = resp.get("top")
-        d.confidence = float(resp.get("confidence") or resp.get("top", {}).get("score", 0.0) or 0.0)
-        d.severity = resp.get("severity") or ("high" if d.confidence > 0.8 else "medium" if d.confidence > 0.5 else "low")
-        d.recommendation = resp.get("explanation_text") or resp.get("recommendation", "")
-        d.status = "completed"
-        d.save()
-        print(f"Saved diagnosis {d.id} for cattle {c.tag_number}: top={d.top_prediction} confidence={d.confidence}")
+    Diagnosis.objects.bulk_create(diagnoses, batch_size=500)
+    for d in diagnoses:
+        print(f"Saved diagnosis {d.id} for cattle {d.cattle.tag_number}: top={d.top_prediction} confidence={d.confidence}")
 
     print("Done. Totals -> Cattle:", Cattle.objects.count(), "Diagnoses:", Diagnosis.objects.count())
 
@@ -4,6 +4,9 @@ Convert an arbitrary PyTorch checkpoint to a clean state_dict compatible with a
 Usage:
     python convert_checkpoint_to_state_dict.py --input models/best_model.pth --output models/best_model_state_dict.pth
 
+When safetensors is installed a .safetensors copy is written next to the output; main.py prefers
+models/best_model.safetensors over models/best_model.pth when both exist.
+
 If torch.load fails because of PyTorch safe globals, set env INFERENCE_ALLOW_UNSAFE_LOAD=1 to let the script
 attempt a fallback load (may execute code inside the checkpoint — only do this if you trust the file).
 """
@@ -15,7 +18,21 @@ import json
 from pathlib import Path
 from torchvision.models import resnet18
 
+# Optional: safetensors for a mmap-able, pickle-free copy next to the .pth
+try:
+    from safetensors.torch import save_file  # type: ignore
+except Exception:
+    save_file = None
+
 def try_torch_load(path, allow_unsafe=False):
+    # Checkpoints written with torch.save(model.state_dict(), ...) (zipfile format) load
+    # memory-mapped on PyTorch 2.1+: tensors are paged in on access instead of copied up front.
+    try:
+        return torch.load(str(path), map_location="cpu", mmap=True, weights_only=True)
+    except TypeError:
+        pass  # older torch without mmap=/weights_only=
+    except Exception as e:
+        print("mmap torch.load(weights_only=True) failed, retrying without mmap:", e)
     try:
         return torch.load(str(path), map_location="cpu")
     except Exception as e:
@@ -45,6 +62,9 @@ def extract_state_dict(ckpt):
         return ckpt
     raise RuntimeError("Unsupported checkpoint type: " + str(type(ckpt)))
 
+# "<name>.<idx>." for a classifier head inside a key, e.g. the "fc.1." in "fc.1.weight"
+_INDEXED_HEAD_RE = re.compile(r"\b(?:fc|classifier|head)\.(\d+)\.")
+
 def remap_keys_for_fc(sd: dict, skeleton_keys: set):
     """
     Heuristic remapping:
@@ -60,6 +80,14 @@ def remap_keys_for_fc(sd: dict, skeleton_keys: set):
     # quick normalized keys
     normalized = {strip_module(k): k for k in keys}
 
+    # one pass over the keys: bucket every key under each "<...>(fc|classifier|head).<idx>."
+    # prefix it carries, so a remap below is a dict lookup instead of a rescan of all keys
+    buckets = {}
+    for k in keys:
+        kstr = strip_module(k)
+        for m in _INDEXED_HEAD_RE.finditer(kstr):
+            buckets.setdefault((kstr[:m.start(1)], m.group(1)), []).append((k, kstr))
+
     for sk in skeleton_keys:
         # if already present in sd (maybe with module. prefix), keep it
         if sk in normalized:
@@ -98,13 +126,11 @@ def remap_keys_for_fc(sd: dict, skeleton_keys: set):
                 idx = m.group(3)     # e.g. '1'
                 rest = m.group(4)    # e.g. 'weight' or 'bias'
                 # for all keys in sd that contain prefix+idx+., map to prefix + rest (remove the index)
-                for k in keys:
-                    kstr = strip_module(k)
-                    if kstr.startswith(prefix + idx + "."):
-                        newkey = kstr.replace(prefix + idx + ".", prefix)
-                        # if collision, prefer existing new value (do not overwrite)
-                        if newkey not in new and newkey not in sd:
-                            new[newkey] = sd[k]
+                for k, kstr in buckets.get((prefix, idx), ()):
+                    newkey = kstr.replace(prefix + idx + ".", prefix)
+                    # if collision, prefer existing new value (do not overwrite)
+                    if newkey not in new and newkey not in sd:
+                        new[newkey] = sd[k]
             else:
                 # fallback: single key mapping
                 new[sk] = sd[found]
@@ -115,6 +141,23 @@ def remap_keys_for_fc(sd: dict, skeleton_keys: set):
             new[kstr] = v
     return new
 
+def save_state_dict(sd, out: Path):
+    """torch.save to out, plus out.with_suffix('.safetensors') when safetensors is installed."""
+    torch.save(sd, str(out))
+    if save_file is None:
+        return
+    st_out = out.with_suffix(".safetensors")
+    try:
+        save_file({k: v.contiguous() for k, v in sd.items()}, str(st_out))
+        print("Wrote:", st_out)
+    except Exception as e:
+        # non-tensor entries or shared storages; the .pth is still usable
+        print("Skipped safetensors copy:", e)
+
+def _leaf(key):
+    """'layer1.0.conv1.weight' -> 'weight'"""
+    return key.rpartition(".")[2]
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", "-i", required=True, help="input checkpoint (models/best_model.pth)")
@@ -148,13 +191,12 @@ def main():
 
     skel = resnet18(weights=None)
     skel.fc = torch.nn.Linear(skel.fc.in_features, num_classes)
-    skel_state_keys = set(k for k in skel.state_dict().keys())
+    skel_state_keys = set(skel.state_dict().keys())
 
-    # quick test: if keys already match, just write
-    normalized_keys = {k for k in sd.keys()}
-    if set(skel_state_keys).issubset(set(normalized_keys)) or set(k.split(".")[-1] for k in skel_state_keys).issubset(set(k.split(".")[-1] for k in normalized_keys)):
+    # quick test: if keys already match (or at least every leaf name does), just write
+    if skel_state_keys.issubset(sd.keys()) or {_leaf(k) for k in skel_state_keys}.issubset({_leaf(k) for k in sd}):
         print("Checkpoint keys already look compatible. Writing out state_dict as-is.")
-        torch.save(sd, str(out))
+        save_state_dict(sd, out)
         print("Wrote:", out)
         return 0
 
@@ -165,13 +207,14 @@ def main():
     try:
         skel.load_state_dict(new_sd, strict=False)
         print("Loaded remapped state_dict into skeleton (strict=False). Now saving cleaned state_dict.")
-        # produce cleaned sd matching skeleton keys only
-        cleaned = {k: v for k, v in new_sd.items() if k in skel.state_dict().keys()}
+        # produce cleaned sd matching skeleton keys only (state_dict() builds a new
+        # dict on every call, so take it once, after the load)
+        skel_sd = skel.state_dict()
+        cleaned = {k: v for k, v in new_sd.items() if k in skel_sd}
         # where cleaned missing keys, take from skeleton to have full shape
-        for k in skel.state_dict().keys():
-            if k not in cleaned:
-                cleaned[k] = skel.state_dict()[k]
-        torch.save(cleaned, str(out))
+        for k in skel_sd:
+            cleaned.setdefault(k, skel_sd[k])
+        save_state_dict(cleaned, out)
         print("Wrote cleaned state_dict to:", out)
         return 0
     except Exception as e:
@@ -187,11 +230,11 @@ def main():
             fallback[kn] = v
         try:
             skel.load_state_dict(fallback, strict=False)
-            cleaned = {k: v for k, v in fallback.items() if k in skel.state_dict().keys()}
-            for k in skel.state_dict().keys():
-                if k not in cleaned:
-                    cleaned[k] = skel.state_dict()[k]
-            torch.save(cleaned, str(out))
+            skel_sd = skel.state_dict()
+            cleaned = {k: v for k, v in fallback.items() if k in skel_sd}
+            for k in skel_sd:
+                cleaned.setdefault(k, skel_sd[k])
+            save_state_dict(cleaned, out)
             print("Fallback cleaned and wrote to", out)
             return 0
         except Exception as e2:
@@ -1,17 +1,37 @@
 ﻿from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from operator import itemgetter
 from PIL import Image
-import os, io, uuid, numpy as np
+import hmac, os, io, uuid, numpy as np
+
+# Optional: orjson for faster response encoding (falls back to stdlib json)
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+# Optional: OpenCV for SIMD decode/resize (falls back to Pillow)
+try:
+    import cv2  # type: ignore
+except Exception:
+    cv2 = None
 
 # Lazy model placeholder
 _model = None
 MODEL_VERSION = os.environ.get("MODEL_VERSION", "v0.1.0")
 INFERENCE_SECRET = os.environ.get("INFERENCE_SECRET", "change-me")
+_SECRET_BYTES = INFERENCE_SECRET.encode()
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
-app = FastAPI(title="AI Cattle Inference")
+app = FastAPI(
+    title="AI Cattle Inference",
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse,
+)
 
 # CORS - allow all for dev, restrict in prod
 app.add_middleware(
@@ -30,7 +50,8 @@ app.mount("/media", StaticFiles(directory=MEDIA_DIR), name="media")
 
 
 def check_secret(val: Optional[str]):
-    if val != INFERENCE_SECRET:
+    # constant-time compare; a missing header is rejected without encoding anything
+    if not val or not hmac.compare_digest(val.encode(), _SECRET_BYTES):
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 
@@ -47,13 +68,34 @@ def _lazy_load_model():
     return _model
 
 
+@app.on_event("startup")
+async def _startup():
+    # load before the first request instead of inside it; once a real model is plugged
+    # in, also run one dummy batch here (e.g. np.zeros((1, 224, 224, 3), np.float32))
+    # so first-call allocations happen at boot
+    _lazy_load_model()
+
+
+def _decode_resized_rgb(file_bytes: bytes, target_size=(224,224)) -> np.ndarray:
+    """Decode and resize to an (H, W, 3) uint8 RGB array; raises on undecodable bytes."""
+    if cv2 is not None:
+        arr = cv2.imdecode(np.frombuffer(file_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if arr is None:
+            raise ValueError("Could not decode image")
+        arr = cv2.resize(arr, target_size, interpolation=cv2.INTER_LINEAR)
+        return cv2.cvtColor(arr, cv2.COLOR_BGR2RGB, dst=arr)
+    img = Image.open(io.BytesIO(file_bytes)).convert("RGB")
+    return np.asarray(img.resize(target_size))
+
+
 def _process_image_bytes(file_bytes: bytes, target_size=(224,224)):
+    """Returns (model input (1, H, W, 3) float32, resized uint8 RGB) from one decode."""
     # Validate and preprocess image
-    img = Image.open(io.BytesIO(file_bytes)).convert("RGB")
-    img = img.resize(target_size)
-    arr = np.array(img).astype(np.float32) / 255.0
-    # shape (H,W,3) -> (1, H, W, 3)
-    return np.expand_dims(arr, 0)
+    rgb = _decode_resized_rgb(file_bytes, target_size)
+    # scale straight into the (1, H, W, 3) float32 batch: no astype/expand_dims copies
+    out = np.empty((1,) + rgb.shape, dtype=np.float32)
+    np.divide(rgb, 255.0, out=out[0], dtype=np.float32)
+    return out, rgb
 
 
 @app.post("/predict/")
@@ -69,30 +111,39 @@ async def predict(
     # Security
     check_secret(inference_secret)
 
-    # Lazy-load model
-    model = _lazy_load_model()
+    # Model is loaded at startup
+    model = _model
 
     predictions: List[Dict[str, Any]] = []
 
     # If image present: validate size and MIME
     gradcam_url = None
     if image:
-        content = await image.read()
-        # max 10MB
-        if len(content) > 10 * 1024 * 1024:
+        # max 10MB: reject on the declared size, else read in chunks and stop as soon as
+        # the budget is exceeded, so an oversized upload is never held in memory whole
+        if (getattr(image, "size", None) or 0) > MAX_IMAGE_BYTES:
             raise HTTPException(status_code=400, detail="Image too large (max 10MB)")
+        buf = bytearray()
+        while chunk := await image.read(UPLOAD_CHUNK_SIZE):
+            buf.extend(chunk)
+            if len(buf) > MAX_IMAGE_BYTES:
+                raise HTTPException(status_code=400, detail="Image too large (max 10MB)")
+        content = bytes(buf)
         mime = image.content_type or ""
         if not mime.startswith("image/"):
             raise HTTPException(status_code=400, detail="Uploaded file is not an image")
         # preprocess (dummy)
-        inp = _process_image_bytes(content, target_size=(224,224))
+        inp, rgb = _process_image_bytes(content, target_size=(224,224))
         # dummy image prediction
         predictions.append({"disease": "Bovine Respiratory Disease (BRD)", "score": 0.87, "source": "image"})
-        # create a dummy gradcam (just re-save the uploaded image into gradcam folder)
+        # create a dummy gradcam (the already decoded 224x224 image, saved to the gradcam folder)
         try:
             uid = str(uuid.uuid4())[:8] + ".jpg"
             gradcam_path = os.path.join(GRADCAM_DIR, uid)
-            Image.open(io.BytesIO(content)).convert("RGB").resize((224,224)).save(gradcam_path)
+            # single-pass baseline encode: no Huffman optimisation, 4:2:0 chroma
+            Image.fromarray(rgb).save(
+                gradcam_path, format="JPEG", quality=80, optimize=False, progressive=False, subsampling=2
+            )
             gradcam_url = f"/media/gradcams/{uid}"
         except Exception:
             gradcam_url = None
@@ -104,8 +155,11 @@ async def predict(
 
     # Ensemble logic (simple)
     # Give image predictions weight 0.6, text 0.4 when both exist
-    # Here we just sort by score for demo
-    predictions = sorted(predictions, key=lambda x: x["score"], reverse=True)
+    # Here we just sort by score for demo (in place; 0/1 entries are already ordered).
+    # Once a real model returns a full class-probability vector, take the top with
+    # np.argmax over the scores array rather than building and sorting dicts.
+    if len(predictions) > 1:
+        predictions.sort(key=itemgetter("score"), reverse=True)
     top = predictions[0] if predictions else {"disease": "Unknown", "score": 0.0}
 
     # confidence: top score